@@ -68,6 +68,8 @@ class ServiceManager:
             "services.api.main:app",
             "--host", "0.0.0.0",
             "--port", "8000",
+            "--loop", "uvloop",
+            "--http", "httptools",
             "--reload"
         ], "API", cwd=".")
 
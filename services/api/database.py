@@ -3,11 +3,19 @@ Database configuration and connection management
 """
 
 import os
+import re
 import sqlite3
+from contextlib import asynccontextmanager
 import aiosqlite
+from aiosqlitepool import SQLiteConnectionPool
 import asyncpg
+import orjson
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+from typing import AsyncIterator, List, Mapping, Optional, Protocol
 import structlog
+from fastapi import Request
 
 logger = structlog.get_logger()
 
@@ -16,10 +24,18 @@ IS_POSTGRES = DATABASE_URL.startswith("postgresql://")
 if not IS_POSTGRES:
     DB_PATH = Path(DATABASE_URL.replace("sqlite:///", "").replace("sqlite://", ""))
 
+# Shared by the expression index below and get_recent_transactions' risk_level
+# filter; the query must repeat the expression verbatim for the index to apply
+RISK_BUCKET_SQL = (
+    "CASE WHEN risk_score >= 7 THEN 'high' "
+    "WHEN risk_score >= 4 THEN 'medium' "
+    "WHEN risk_score < 4 THEN 'low' END"
+)
+
 async def init_db():
     """Initialize SQLite database with schema"""
     
-    schema_sql = """
+    schema_sql = f"""
     -- Users table
     CREATE TABLE IF NOT EXISTS users (
         id TEXT PRIMARY KEY,
@@ -152,6 +168,18 @@ async def init_db():
         deployed_at TIMESTAMP,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
+
+    -- Indexes backing the "recent alerts" top-N queries
+    CREATE INDEX IF NOT EXISTS idx_alerts_created_desc ON alerts (created_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_alerts_severity_created ON alerts (severity, created_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_alerts_open_created ON alerts (created_at DESC) WHERE status = 'open';
+
+    -- Indexes backing the recent-transactions listing and its risk_level buckets
+    CREATE INDEX IF NOT EXISTS idx_transactions_created_desc ON transactions (created_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_transactions_risk_bucket_created ON transactions (({RISK_BUCKET_SQL}), created_at DESC);
+
+    -- Backs the dashboard's open/priority case filter and leaves the closed backlog out
+    CREATE INDEX IF NOT EXISTS idx_cases_active_priority_created ON cases (priority, created_at DESC) WHERE status <> 'closed';
     """
     
     if IS_POSTGRES:
@@ -170,15 +198,191 @@ async def init_db():
             await db.commit()
         logger.info("Database schema initialized", db_path=str(DB_PATH))
 
-async def get_db():
-    """Get database connection"""
-    if IS_POSTGRES:
-        conn = await asyncpg.connect(DATABASE_URL)
+# Per worker process: keep WORKERS * DB_POOL_MAX_SIZE below Postgres max_connections
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+# Hot by-id lookups, prepared once per pooled connection; PostgresStrategy
+# routes a query through conn.stmts[sql] whenever its text matches
+CASE_BY_ID_SQL = "SELECT * FROM cases WHERE id = $1"
+TRANSACTION_BY_ID_SQL = "SELECT * FROM transactions WHERE id = $1"
+PREPARED_STATEMENTS = (CASE_BY_ID_SQL, TRANSACTION_BY_ID_SQL)
+
+def _encode_json(value) -> str:
+    return value if isinstance(value, str) else orjson.dumps(value).decode()
+
+def load_json_column(value):
+    """Parse a JSON column read from either backend
+
+    Postgres json/jsonb values are already decoded by the connection codec;
+    SQLite (and Postgres TEXT columns) hand back the raw string.
+    """
+    return orjson.loads(value) if isinstance(value, str) else value
+
+class PreparedConnection(asyncpg.Connection):
+    """asyncpg connection that carries its prepared statements"""
+    __slots__ = ("stmts",)
+
+async def _init_pg_connection(conn: PreparedConnection):
+    """Register codecs and prepare the hot statements on each new connection"""
+    # Decode NUMERIC straight to float instead of allocating Decimal objects
+    await conn.set_type_codec(
+        "numeric", encoder=str, decoder=float, schema="pg_catalog", format="text"
+    )
+    # json/jsonb columns arrive as Python objects; writers share their
+    # pre-serialized text with SQLite, so strings are sent through as-is
+    for json_type in ("json", "jsonb"):
+        await conn.set_type_codec(
+            json_type, encoder=_encode_json, decoder=orjson.loads, schema="pg_catalog", format="text"
+        )
+    conn.stmts = {sql: await conn.prepare(sql) for sql in PREPARED_STATEMENTS}
+
+async def create_pg_pool() -> asyncpg.Pool:
+    """Create the shared asyncpg pool used by request handlers"""
+    pool = await asyncpg.create_pool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        max_queries=50000,
+        max_inactive_connection_lifetime=300,
+        statement_cache_size=1024,
+        connection_class=PreparedConnection,
+        init=_init_pg_connection,
+    )
+    logger.info("Postgres connection pool created", min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE)
+    return pool
+
+SQLITE_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-64000;
+PRAGMA mmap_size=268435456;
+PRAGMA busy_timeout=5000;
+"""
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "5"))
+
+# TIMESTAMP columns come back as datetime, so Pydantic/orjson never re-parse ISO strings
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+async def _connect_sqlite() -> aiosqlite.Connection:
+    """Open a pooled SQLite connection with WAL and cache pragmas applied
+
+    Connections run in autocommit mode: every route write is a single
+    statement, so there is no separate commit() hop to the aiosqlite thread.
+    """
+    db = await aiosqlite.connect(
+        DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES, isolation_level=None
+    )
+    db.row_factory = aiosqlite.Row
+    await db.executescript(SQLITE_PRAGMAS)
+    return db
+
+def create_sqlite_pool() -> SQLiteConnectionPool:
+    """Create the SQLite pool; WAL lets its connections read concurrently"""
+    pool = SQLiteConnectionPool(connection_factory=_connect_sqlite, pool_size=SQLITE_POOL_SIZE)
+    logger.info("SQLite connection pool created", db_path=str(DB_PATH), pool_size=SQLITE_POOL_SIZE)
+    return pool
+
+class DbStrategy(Protocol):
+    """Backend-specific query execution, selected once at import time
+
+    Routes write their SQL once with Postgres-style $N placeholders and call
+    these methods instead of branching on IS_POSTGRES.
+    """
+
+    async def fetch_one(self, db, query: str, *params) -> Optional[Mapping]:
+        ...
+
+    async def fetch_many(self, db, query: str, *params) -> List[Mapping]:
+        ...
+
+    async def execute(self, db, query: str, *params) -> None:
+        ...
+
+    async def execute_many(self, db, query: str, rows: List[tuple]) -> None:
+        ...
+
+    def iterate(self, state, query: str, *params) -> AsyncIterator[Mapping]:
+        ...
+
+class PostgresStrategy:
+    """asyncpg execution; by-id lookups go through the connection's prepared statements"""
+
+    # asyncpg fetches this many rows per round-trip while a cursor is iterated
+    CURSOR_PREFETCH = 50
+
+    async def fetch_one(self, db, query: str, *params) -> Optional[Mapping]:
+        stmt = db.stmts.get(query)
+        if stmt is not None:
+            return await stmt.fetchrow(*params)
+        return await db.fetchrow(query, *params)
+
+    async def fetch_many(self, db, query: str, *params) -> List[Mapping]:
+        return await db.fetch(query, *params)
+
+    async def execute(self, db, query: str, *params) -> None:
+        await db.execute(query, *params)
+
+    async def execute_many(self, db, query: str, rows: List[tuple]) -> None:
+        # asyncpg pipelines the Bind/Execute messages for every row in one round-trip
+        await db.executemany(query, rows)
+
+    async def iterate(self, state, query: str, *params) -> AsyncIterator[Mapping]:
+        async with state.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                async for record in conn.cursor(query, *params, prefetch=self.CURSOR_PREFETCH):
+                    yield record
+
+_PG_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+@lru_cache(maxsize=512)
+def _to_sqlite_params(query: str) -> str:
+    """Rewrite $N placeholders as SQLite's numbered ?N form"""
+    return _PG_PLACEHOLDER.sub(r"?\1", query)
+
+class SqliteStrategy:
+    """aiosqlite execution; connections run in autocommit mode so nothing is committed here"""
+
+    async def fetch_one(self, db, query: str, *params) -> Optional[Mapping]:
+        async with db.execute(_to_sqlite_params(query), params) as cursor:
+            return await cursor.fetchone()
+
+    async def fetch_many(self, db, query: str, *params) -> List[Mapping]:
+        return await db.execute_fetchall(_to_sqlite_params(query), params)
+
+    async def execute(self, db, query: str, *params) -> None:
+        await db.execute(_to_sqlite_params(query), params)
+
+    async def execute_many(self, db, query: str, rows: List[tuple]) -> None:
+        # One explicit transaction instead of an autocommit per row
+        await db.execute("BEGIN")
         try:
+            await db.executemany(_to_sqlite_params(query), rows)
+        except BaseException:
+            await db.execute("ROLLBACK")
+            raise
+        await db.execute("COMMIT")
+
+    async def iterate(self, state, query: str, *params) -> AsyncIterator[Mapping]:
+        async with state.sqlite_pool.connection() as db:
+            async with db.execute(_to_sqlite_params(query), params) as cursor:
+                async for row in cursor:
+                    yield row
+
+db_strategy: DbStrategy = PostgresStrategy() if IS_POSTGRES else SqliteStrategy()
+
+@asynccontextmanager
+async def db_connection(state):
+    """Borrow a pooled connection, for handlers that only sometimes need one"""
+    if IS_POSTGRES:
+        async with state.pg_pool.acquire() as conn:
             yield conn
-        finally:
-            await conn.close()
     else:
-        async with aiosqlite.connect(DB_PATH) as db:
-            db.row_factory = aiosqlite.Row
-            yield db
+        async with state.sqlite_pool.connection() as conn:
+            yield conn
+
+async def get_db(request: Request):
+    """Get database connection"""
+    async with db_connection(request.app.state) as conn:
+        yield conn
@@ -3,13 +3,24 @@ AMLGuard API Service
 Main FastAPI application for transaction processing and alert management
 """
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import asyncio
+import logging
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
+from prometheus_client import CollectorRegistry, REGISTRY, make_asgi_app, multiprocess
+from prometheus_fastapi_instrumentator import Instrumentator
 import structlog
 from contextlib import asynccontextmanager
 
-from .database import init_db
+from .database import init_db, create_pg_pool, create_sqlite_pool, db_connection, db_strategy, IS_POSTGRES
 from .routes import transactions, alerts, cases, auth
 
 # Configure structured logging
@@ -32,24 +43,50 @@ structlog.configure(
 
 logger = structlog.get_logger()
 
+def _start_log_listener() -> QueueListener:
+    """Route stdlib (and therefore structlog) records through a background thread"""
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(logging.INFO)
+    listener.start()
+    return listener
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
+    log_listener = _start_log_listener()
     logger.info("Starting AMLGuard API Service")
+    if auth.JWT_SECRET == auth.DEV_JWT_SECRET:
+        logger.warning("JWT_SECRET not set, signing tokens with the development key")
+    app.state.jwt_key = auth.JWT_SECRET.encode()
     
     # Initialize database
     await init_db()
     logger.info("Database initialized")
+    if IS_POSTGRES:
+        app.state.pg_pool = await create_pg_pool()
+    else:
+        app.state.sqlite_pool = create_sqlite_pool()
     
     yield
     
     logger.info("Shutting down AMLGuard API Service")
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+    if IS_POSTGRES:
+        await app.state.pg_pool.close()
+    else:
+        await app.state.sqlite_pool.close()
+    log_listener.stop()
 
 # Create FastAPI app
 app = FastAPI(
     title="AMLGuard API",
     description="Anti-Money Laundering Compliance Platform API",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -62,6 +99,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics. Scrapes are served by a separately mounted ASGI app so
+# rendering the exposition text never goes through the API's routing stack.
+Instrumentator(
+    should_group_status_codes=True,
+    should_ignore_untemplated=True,
+    should_instrument_requests_inprogress=True,
+    excluded_handlers=["^/$", "^/api/health$", "^/metrics"],  # Regexes, so anchor them
+).instrument(app)
+
+def _metrics_registry() -> CollectorRegistry:
+    """Aggregate the per-worker mmap files when running multiprocess"""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+app.mount("/metrics", make_asgi_app(registry=_metrics_registry()))
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(transactions.router, prefix="/api/transactions", tags=["Transactions"])
@@ -89,27 +145,71 @@ async def health_check():
         }
     }
 
-@app.get("/api/metrics")
-async def get_metrics():
-    """Prometheus metrics endpoint"""
-    # TODO: Implement Prometheus metrics
-    return {"message": "Metrics endpoint - to be implemented"}
+# One pass per table; $1/$2 are the start-of-day bounds for today/yesterday
+DASHBOARD_METRICS_SQL = """
+    WITH a AS (
+        SELECT
+            COUNT(*) FILTER (WHERE status = 'open') AS active_alerts,
+            COUNT(*) FILTER (WHERE created_at >= $1) AS alerts_today,
+            COUNT(*) FILTER (WHERE created_at >= $2 AND created_at < $1) AS alerts_yesterday
+        FROM alerts
+    ), t AS (
+        SELECT
+            COUNT(*) FILTER (WHERE created_at >= $1) AS transactions_today,
+            COUNT(*) FILTER (WHERE created_at >= $2 AND created_at < $1) AS transactions_yesterday,
+            AVG(risk_score) FILTER (WHERE created_at >= $1) AS risk_today,
+            AVG(risk_score) FILTER (WHERE created_at >= $2 AND created_at < $1) AS risk_yesterday
+        FROM transactions
+    ), c AS (
+        SELECT
+            COUNT(*) FILTER (WHERE status = 'open') AS open_cases,
+            COUNT(*) FILTER (WHERE status = 'open' AND priority IN ('high', 'critical')) AS urgent_cases
+        FROM cases
+    )
+    SELECT * FROM a, t, c
+"""
+DASHBOARD_CACHE_TTL_SECONDS = 10
 
-@app.get("/api/metrics/dashboard")
-async def get_dashboard_metrics():
-    """Get dashboard metrics"""
-    # Mock data for development
+# Dashboards poll this endpoint; serve a short-lived copy instead of re-aggregating
+_dashboard_cache = {"expires_at": 0.0, "value": None}
+_dashboard_lock = asyncio.Lock()
+
+def _percent_change(today: float, yesterday: float) -> str:
+    if not yesterday:
+        return "+0%"
+    return f"{(today - yesterday) / yesterday * 100:+.1f}%"
+
+async def _query_dashboard_metrics(db) -> dict:
+    """Aggregate dashboard counters in a single statement"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    yesterday = today - timedelta(days=1)
+    row = await db_strategy.fetch_one(db, DASHBOARD_METRICS_SQL, today, yesterday)
+    risk_today = float(row["risk_today"] or 0)
+    risk_yesterday = float(row["risk_yesterday"] or 0)
     return {
-        "activeAlerts": 23,
-        "dailyTransactions": 12847,
-        "avgRiskScore": 2.3,
-        "openCases": 7,
-        "alertsChange": "+12% from yesterday",
-        "transactionsChange": "+5.2% from yesterday",
-        "riskScoreChange": "-0.1 from yesterday",
-        "urgentCases": 2
+        "activeAlerts": row["active_alerts"],
+        "dailyTransactions": row["transactions_today"],
+        "avgRiskScore": round(risk_today, 2),
+        "openCases": row["open_cases"],
+        "alertsChange": f"{_percent_change(row['alerts_today'], row['alerts_yesterday'])} from yesterday",
+        "transactionsChange": f"{_percent_change(row['transactions_today'], row['transactions_yesterday'])} from yesterday",
+        "riskScoreChange": f"{risk_today - risk_yesterday:+.1f} from yesterday",
+        "urgentCases": row["urgent_cases"]
     }
 
+@app.get("/api/metrics/dashboard")
+async def get_dashboard_metrics(request: Request):
+    """Get dashboard metrics"""
+    # A pool connection is only taken when the cached copy has expired
+    if _dashboard_cache["expires_at"] > time.monotonic():
+        return _dashboard_cache["value"]
+    async with _dashboard_lock:
+        if _dashboard_cache["expires_at"] <= time.monotonic():
+            async with db_connection(request.app.state) as db:
+                _dashboard_cache["value"] = await _query_dashboard_metrics(db)
+            _dashboard_cache["expires_at"] = time.monotonic() + DASHBOARD_CACHE_TTL_SECONDS
+        return _dashboard_cache["value"]
+
 @app.get("/api/system/status")
 async def get_system_status():
     """Get system status"""
@@ -125,11 +225,21 @@ async def get_system_status():
     }
 
 if __name__ == "__main__":
+    import shutil
     import uvicorn
+    workers = int(os.getenv("WORKERS", "4"))
+    if workers > 1:
+        # Workers inherit this and write metrics to mmap files there; start clean
+        multiproc_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/amlguard-prometheus")
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir)
     uvicorn.run(
-        "main:app",
+        "services.api.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        loop="uvloop",
+        http="httptools",
+        workers=workers,
+        reload=workers == 1,  # uvicorn can't reload a multi-worker server
         log_config=None  # Use structlog instead
     )
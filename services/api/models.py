@@ -47,7 +47,7 @@ class TransactionResponse(BaseModel):
     transaction_type: str
     description: Optional[str]
     location: Optional[Dict[str, Any]]
-    risk_score: Optional[Decimal]
+    risk_score: Optional[float]
     ml_prediction: Optional[Dict[str, Any]]
     rules_hit: Optional[List[str]]
     status: str
@@ -63,7 +63,7 @@ class AlertResponse(BaseModel):
     severity: str
     title: str
     description: str
-    risk_score: Decimal
+    risk_score: float
     assigned_to: Optional[str]
     status: str
     resolved_at: Optional[datetime]
@@ -0,0 +1,26 @@
+"""
+RFC 7240 Prefer header handling
+"""
+
+from typing import Optional
+
+from fastapi import Header
+from fastapi.responses import ORJSONResponse
+
+def return_minimal(prefer: Optional[str] = Header(default=None)) -> bool:
+    """Whether the client sent Prefer: return=minimal"""
+    if not prefer:
+        return False
+    for preference in prefer.split(","):
+        token = preference.split(";", 1)[0].replace(" ", "").lower()
+        if token == "return=minimal":
+            return True
+    return False
+
+def created_minimal(resource_id: str) -> ORJSONResponse:
+    """201 carrying only the new id, acknowledging the applied preference"""
+    return ORJSONResponse(
+        {"id": resource_id},
+        status_code=201,
+        headers={"Preference-Applied": "return=minimal"},
+    )
@@ -2,53 +2,59 @@
 Alert management routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from typing import List, Optional
 import asyncpg
 from datetime import datetime
 
-from ..database import get_db, IS_POSTGRES
+from ..database import get_db, db_strategy
 from ..models import AlertResponse, AlertUpdate
+from ..streaming import stream_rows, json_array_response
 from .auth import verify_token
 
 router = APIRouter()
 
+ALERT_COLUMNS = (
+    "id, transaction_id, customer_id, alert_type, severity, title, description, "
+    "risk_score, assigned_to, status, resolved_at, created_at, updated_at"
+)
+
+# update_alert only ever sets these optional columns (plus updated_at), so
+# every shape is rendered once here and the driver's statement cache can hit
+_ALERT_UPDATE_COLUMNS = ("assigned_to", "status", "resolved_at")
+
+def _build_update_alert_sql(mask: int) -> str:
+    """Render the UPDATE ... RETURNING statement for one combination of set columns"""
+    columns = [c for bit, c in enumerate(_ALERT_UPDATE_COLUMNS) if mask >> bit & 1]
+    columns.append("updated_at")
+    assignments = ", ".join(f"{c} = ${i + 1}" for i, c in enumerate(columns))
+    return (
+        f"UPDATE alerts SET {assignments} WHERE id = ${len(columns) + 1} "
+        f"RETURNING {ALERT_COLUMNS}"
+    )
+
+_UPDATE_ALERT_SQL = {mask: _build_update_alert_sql(mask) for mask in range(1, 1 << len(_ALERT_UPDATE_COLUMNS))}
+
 @router.get("/recent", response_model=List[AlertResponse])
 async def get_recent_alerts(
+    request: Request,
     limit: int = Query(default=10, le=100),
     severity: Optional[str] = Query(default=None),
     status_filter: Optional[str] = Query(default=None, alias="status"),
-    token_data: dict = Depends(verify_token),
-    db = Depends(get_db)
+    token_data: dict = Depends(verify_token)
 ):
-    """Get recent alerts with optional filtering"""
-    if IS_POSTGRES:
-        query = "SELECT * FROM alerts WHERE 1=1"
-        params = []
-        if severity:
-            query += f" AND severity = ${len(params)+1}"
-            params.append(severity)
-        if status_filter:
-            query += f" AND status = ${len(params)+1}"
-            params.append(status_filter)
-        query += f" ORDER BY created_at DESC LIMIT ${len(params)+1}"
-        params.append(limit)
-        rows = await db.fetch(query, *params)
-        return [_alert_from_row(dict(row)) for row in rows]
-    else:
-        query = "SELECT * FROM alerts WHERE 1=1"
-        params = []
-        if severity:
-            query += " AND severity = ?"
-            params.append(severity)
-        if status_filter:
-            query += " AND status = ?"
-            params.append(status_filter)
-        query += " ORDER BY created_at DESC LIMIT ?"
-        params.append(limit)
-        async with db.execute(query, params) as cursor:
-            rows = await cursor.fetchall()
-        return [_alert_from_row(dict(row)) for row in rows]
+    """Get recent alerts with optional filtering, streamed as a JSON array"""
+    query = f"SELECT {ALERT_COLUMNS} FROM alerts WHERE 1=1"
+    params = []
+    if severity:
+        query += f" AND severity = ${len(params)+1}"
+        params.append(severity)
+    if status_filter:
+        query += f" AND status = ${len(params)+1}"
+        params.append(status_filter)
+    query += f" ORDER BY created_at DESC LIMIT ${len(params)+1}"
+    params.append(limit)
+    return json_array_response(stream_rows(request, query, params), _alert_from_row)
 
 @router.get("/{alert_id}", response_model=AlertResponse)
 async def get_alert(
@@ -57,17 +63,10 @@ async def get_alert(
     db = Depends(get_db)
 ):
     """Get alert by ID"""
-    if IS_POSTGRES:
-        row = await db.fetchrow("SELECT * FROM alerts WHERE id = $1", alert_id)
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert not found")
-        return _alert_from_row(dict(row))
-    else:
-        async with db.execute("SELECT * FROM alerts WHERE id = ?", (alert_id,)) as cursor:
-            row = await cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert not found")
-        return _alert_from_row(dict(row))
+    row = await db_strategy.fetch_one(db, f"SELECT {ALERT_COLUMNS} FROM alerts WHERE id = $1", alert_id)
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert not found")
+    return _alert_from_row(row)
 
 @router.patch("/{alert_id}", response_model=AlertResponse)
 async def update_alert(
@@ -77,55 +76,23 @@ async def update_alert(
     db = Depends(get_db)
 ):
     """Update alert status or assignment"""
-    if IS_POSTGRES:
-        row = await db.fetchrow("SELECT * FROM alerts WHERE id = $1", alert_id)
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert not found")
-        updates = []
-        params = []
-        if alert_update.assigned_to is not None:
-            updates.append(f"assigned_to = ${len(params)+1}")
-            params.append(alert_update.assigned_to)
-        if alert_update.status is not None:
-            updates.append(f"status = ${len(params)+1}")
-            params.append(alert_update.status)
-            if alert_update.status == "resolved":
-                updates.append(f"resolved_at = ${len(params)+1}")
-                params.append(datetime.utcnow())
-        if updates:
-            updates.append(f"updated_at = ${len(params)+1}")
-            params.append(datetime.utcnow())
-            params.append(alert_id)
-            query = f"UPDATE alerts SET {', '.join(updates)} WHERE id = ${len(params)}"
-            await db.execute(query, *params)
-        updated_row = await db.fetchrow("SELECT * FROM alerts WHERE id = $1", alert_id)
-        return _alert_from_row(dict(updated_row))
-    else:
-        async with db.execute("SELECT * FROM alerts WHERE id = ?", (alert_id,)) as cursor:
-            row = await cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert not found")
-        updates = []
-        params = []
-        if alert_update.assigned_to is not None:
-            updates.append("assigned_to = ?")
-            params.append(alert_update.assigned_to)
-        if alert_update.status is not None:
-            updates.append("status = ?")
-            params.append(alert_update.status)
-            if alert_update.status == "resolved":
-                updates.append("resolved_at = ?")
-                params.append(datetime.utcnow())
-        if updates:
-            updates.append("updated_at = ?")
-            params.append(datetime.utcnow())
-            params.append(alert_id)
-            query = f"UPDATE alerts SET {', '.join(updates)} WHERE id = ?"
-            await db.execute(query, params)
-            await db.commit()
-        async with db.execute("SELECT * FROM alerts WHERE id = ?", (alert_id,)) as cursor:
-            updated_row = await cursor.fetchone()
-        return _alert_from_row(dict(updated_row))
+    now = datetime.utcnow()
+    resolved = alert_update.status == "resolved"
+    mask = (
+        (alert_update.assigned_to is not None)
+        | (alert_update.status is not None) << 1
+        | resolved << 2
+    )
+    if not mask:
+        return await get_alert(alert_id, token_data, db)
+    values = (alert_update.assigned_to, alert_update.status, now)
+    params = [values[bit] for bit in range(len(values)) if mask >> bit & 1]
+    params += [now, alert_id]
+    # RETURNING needs SQLite 3.35+
+    row = await db_strategy.fetch_one(db, _UPDATE_ALERT_SQL[mask], *params)
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert not found")
+    return _alert_from_row(row)
 
 @router.post("/{alert_id}/assign")
 async def assign_alert(
@@ -135,34 +102,20 @@ async def assign_alert(
     db = Depends(get_db)
 ):
     """Assign alert to a user"""
-    if IS_POSTGRES:
-        await db.execute(
-            "UPDATE alerts SET assigned_to = $1, updated_at = $2 WHERE id = $3",
-            assigned_to, datetime.utcnow(), alert_id
-        )
-        return {"message": "Alert assigned successfully"}
-    else:
-        await db.execute(
-            "UPDATE alerts SET assigned_to = ?, updated_at = ? WHERE id = ?",
-            (assigned_to, datetime.utcnow(), alert_id)
-        )
-        await db.commit()
-        return {"message": "Alert assigned successfully"}
-
-def _alert_from_row(row: dict) -> AlertResponse:
-    """Convert database row to AlertResponse"""
-    return AlertResponse(
-        id=row["id"],
-        transaction_id=row["transaction_id"],
-        customer_id=row["customer_id"],
-        alert_type=row["alert_type"],
-        severity=row["severity"],
-        title=row["title"],
-        description=row["description"],
-        risk_score=row["risk_score"],
-        assigned_to=row["assigned_to"],
-        status=row["status"],
-        resolved_at=row["resolved_at"],
-        created_at=row["created_at"],
-        updated_at=row["updated_at"]
+    await db_strategy.execute(
+        db,
+        "UPDATE alerts SET assigned_to = $1, updated_at = $2 WHERE id = $3",
+        assigned_to, datetime.utcnow(), alert_id
     )
+    return {"message": "Alert assigned successfully"}
+
+def _alert_from_row(row) -> dict:
+    """Convert database row to an AlertResponse-shaped dict
+
+    The alerts columns map 1:1 onto AlertResponse. FastAPI validates the
+    return value of /{alert_id} and PATCH against response_model, so building
+    the model here would validate those rows twice. /recent streams its body,
+    which bypasses response_model: its rows go out as-is, and the
+    response_model there only documents the shape.
+    """
+    return dict(row)
@@ -2,62 +2,115 @@
 Authentication routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import asyncio
+import hashlib
+import os
+import time
 import asyncpg
 import bcrypt
 import jwt
-import json
-from datetime import datetime, timedelta
+import orjson
+from cachetools import TTLCache
+from datetime import datetime
 from uuid import uuid4
+from functools import lru_cache
 
-from ..database import get_db, IS_POSTGRES
+from ..database import get_db, db_strategy
 from ..models import LoginRequest, LoginResponse, UserResponse
 
 router = APIRouter()
 security = HTTPBearer()
 
-JWT_SECRET = "dev-secret-key"  # In production, use environment variable
+DEV_JWT_SECRET = "dev-secret-key"
+JWT_SECRET = os.getenv("JWT_SECRET", DEV_JWT_SECRET)  # Loaded onto app.state.jwt_key in lifespan
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
+AUTH_BYPASS = os.getenv("AUTH_BYPASS", "true").lower() == "true"  # Dev mode default
 
-async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    # BYPASS AUTH: Always return a dummy user
-    return {"sub": "bypass-user-id", "username": "bypass", "role": "admin"}
+# Reused signer so login doesn't rebuild it per token
+_JWS = jwt.PyJWS()
+
+# Checked against when the username is unknown so the response time doesn't reveal it
+_DUMMY_PASSWORD_HASH = bcrypt.hashpw(b"amlguard-dummy-password", bcrypt.gensalt())
+
+async def _check_password(password: str, user_row) -> bool:
+    """Verify a password off the event loop; bcrypt is deliberately slow"""
+    hashed = user_row["password"].encode() if user_row else _DUMMY_PASSWORD_HASH
+    matches = await asyncio.to_thread(bcrypt.checkpw, password.encode(), hashed)
+    return matches and user_row is not None
+
+@lru_cache(maxsize=4096)
+def _parse_permissions(raw: str) -> tuple:
+    """Parse the permissions JSON column; identical strings are parsed once"""
+    return tuple(orjson.loads(raw))
+
+def _permissions_list(raw) -> list:
+    """Permissions as a list; a Postgres json column arrives already decoded"""
+    if not raw:
+        return []
+    return list(_parse_permissions(raw) if isinstance(raw, str) else raw)
+
+# Verified payloads by token digest; the token's own exp is still checked on every hit
+TOKEN_CACHE_TTL_SECONDS = 30
+_token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL_SECONDS)
+
+def _decode_token(token: str, key: bytes) -> dict:
+    """Verify a JWT signature, memoizing the payload for repeat bearers
+
+    The cache is keyed by a blake2b digest so raw tokens aren't kept in memory,
+    and the signing key is hashed in so rotating app.state.jwt_key stops
+    tokens signed with the old key from being served out of the cache.
+    Nothing awaits between lookup and store, so no lock is needed.
+    """
+    digest = hashlib.blake2b(key + b"." + token.encode(), digest_size=16).digest()
+    payload = _token_cache.get(digest)
+    if payload is None:
+        # exp is required: verify_token re-checks it on every cache hit
+        payload = jwt.decode(token, key, algorithms=[JWT_ALGORITHM], options={"require": ["exp"]})
+        _token_cache[digest] = payload
+    return payload
+
+async def verify_token(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if AUTH_BYPASS:
+        # BYPASS AUTH: Always return a dummy user
+        return {"sub": "bypass-user-id", "username": "bypass", "role": "admin"}
+    try:
+        payload = _decode_token(credentials.credentials, request.app.state.jwt_key)
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    # Cached entries outlive their first check, so expiry is re-validated on every hit
+    if payload["exp"] <= time.time():
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+    return payload
 
 @router.post("/login", response_model=LoginResponse)
 async def login(
+    request: Request,
     login_data: LoginRequest,
     db = Depends(get_db)
 ):
     """Authenticate user and return JWT token"""
-    if IS_POSTGRES:
-        user_row = await db.fetchrow("SELECT * FROM users WHERE username = $1", login_data.username)
-        if not user_row:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-        user = dict(user_row)
-        if not bcrypt.checkpw(login_data.password.encode(), user["password"].encode()):
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-        await db.execute("UPDATE users SET last_login = $1 WHERE id = $2", datetime.utcnow(), user["id"])
-    else:
-        async with db.execute("SELECT * FROM users WHERE username = ?", (login_data.username,)) as cursor:
-            user_row = await cursor.fetchone()
-        if not user_row:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-        user = dict(user_row)
-        if not bcrypt.checkpw(login_data.password.encode(), user["password"].encode()):
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-        await db.execute("UPDATE users SET last_login = ? WHERE id = ?", (datetime.utcnow(), user["id"]))
-        await db.commit()
+    # The password has to be checked before anything is written, so the
+    # lookup can't be folded into the last_login UPDATE
+    user_row = await db_strategy.fetch_one(db, "SELECT * FROM users WHERE username = $1", login_data.username)
+    if not await _check_password(login_data.password, user_row):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    user = dict(await db_strategy.fetch_one(
+        db,
+        "UPDATE users SET last_login = $1 WHERE id = $2 RETURNING *",
+        datetime.utcnow(), user_row["id"]
+    ))
     token_data = {
         "sub": user["id"],
         "username": user["username"],
         "role": user["role"],
-        "exp": datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
+        "exp": int(time.time()) + JWT_EXPIRATION_HOURS * 3600
     }
-    token = jwt.encode(token_data, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    token = _JWS.encode(orjson.dumps(token_data), request.app.state.jwt_key, algorithm=JWT_ALGORITHM)
     user.pop("password")
-    user["permissions"] = json.loads(user.get("permissions", "[]"))
+    user["permissions"] = _permissions_list(user.get("permissions"))
     return LoginResponse(user=user, token=token)
 
 @router.get("/me", response_model=UserResponse)
@@ -67,23 +120,13 @@ async def get_current_user(
 ):
     """Get current user information"""
     user_id = token_data["sub"]
-    if IS_POSTGRES:
-        user_row = await db.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
-        if not user_row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        user = dict(user_row)
-        user.pop("password")
-        user["permissions"] = json.loads(user.get("permissions", "[]"))
-        return UserResponse(**user)
-    else:
-        async with db.execute("SELECT * FROM users WHERE id = ?", (user_id,)) as cursor:
-            user_row = await cursor.fetchone()
-        if not user_row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        user = dict(user_row)
-        user.pop("password")
-        user["permissions"] = json.loads(user.get("permissions", "[]"))
-        return UserResponse(**user)
+    user_row = await db_strategy.fetch_one(db, "SELECT * FROM users WHERE id = $1", user_id)
+    if not user_row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    user = dict(user_row)
+    user.pop("password")
+    user["permissions"] = _permissions_list(user.get("permissions"))
+    return UserResponse(**user)
 
 @router.post("/logout")
 async def logout():
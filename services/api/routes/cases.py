@@ -2,116 +2,123 @@
 Case management routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from typing import List, Mapping, Optional
 import asyncpg
-import json
+import orjson
+from operator import itemgetter
 from uuid import uuid4
 from datetime import datetime
 
-from ..database import get_db, IS_POSTGRES
+from ..database import get_db, db_strategy, load_json_column, CASE_BY_ID_SQL
 from ..models import CaseCreate, CaseResponse, CaseUpdate
+from ..prefer import return_minimal, created_minimal
+from ..streaming import stream_rows, json_array_response
 from .auth import verify_token
 
 router = APIRouter()
 
+# get_cases filters on any combination of these columns; every combination is
+# rendered once so the SQL text is constant and the driver's statement cache hits
+_CASE_FILTER_COLUMNS = ("status", "priority", "assigned_to")
+
+# Extra mask bit: repeat idx_cases_active_priority_created's predicate as a
+# literal so the planner can prove a bound status filter implies it
+_ACTIVE_ONLY = 1 << len(_CASE_FILTER_COLUMNS)
+
+def _build_get_cases_sql(mask: int) -> str:
+    """Render the filtered case listing for one combination of filter columns"""
+    columns = [c for bit, c in enumerate(_CASE_FILTER_COLUMNS) if mask >> bit & 1]
+    conditions = "".join(f" AND {c} = ${i + 1}" for i, c in enumerate(columns))
+    if mask & _ACTIVE_ONLY:
+        conditions += " AND status <> 'closed'"
+    return (
+        f"SELECT * FROM cases WHERE 1=1{conditions} "
+        f"ORDER BY created_at DESC LIMIT ${len(columns) + 1}"
+    )
+
+_GET_CASES_SQL = {mask: _build_get_cases_sql(mask) for mask in range(1 << len(_CASE_FILTER_COLUMNS) + 1)}
+
+_INSERT_CASE_SQL = """
+    INSERT INTO cases (
+        id, customer_id, title, description, priority,
+        status, alert_ids, created_at, updated_at
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+"""
+_INSERT_CASE_RETURNING_SQL = f"{_INSERT_CASE_SQL} RETURNING *"
+
 @router.post("/", response_model=CaseResponse)
 async def create_case(
     case: CaseCreate,
+    minimal: bool = Depends(return_minimal),
     token_data: dict = Depends(verify_token),
     db = Depends(get_db)
 ):
-    """Create a new case"""
+    """Create a new case; Prefer: return=minimal responds with just the id"""
     case_id = str(uuid4())
     now = datetime.utcnow()
-    if IS_POSTGRES:
-        await db.execute(
-            """
-            INSERT INTO cases (
-                id, customer_id, title, description, priority,
-                status, alert_ids, created_at, updated_at
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-            """,
-            case_id,
+    params = (
+        case_id,
+        case.customer_id,
+        case.title,
+        case.description,
+        case.priority,
+        "open",
+        orjson.dumps(case.alert_ids).decode(),
+        now,
+        now
+    )
+    if minimal:
+        await db_strategy.execute(db, _INSERT_CASE_SQL, *params)
+        return created_minimal(case_id)
+    row = await db_strategy.fetch_one(db, _INSERT_CASE_RETURNING_SQL, *params)
+    return _case_from_row(row)
+
+@router.post("/bulk")
+async def create_cases_bulk(
+    cases: List[CaseCreate],
+    token_data: dict = Depends(verify_token),
+    db = Depends(get_db)
+):
+    """Create many cases in one batch and return their ids"""
+    now = datetime.utcnow()
+    rows = [
+        (
+            str(uuid4()),
             case.customer_id,
             case.title,
             case.description,
             case.priority,
             "open",
-            json.dumps(case.alert_ids),
+            orjson.dumps(case.alert_ids).decode(),
             now,
             now
         )
-        row = await db.fetchrow("SELECT * FROM cases WHERE id = $1", case_id)
-        return _case_from_row(dict(row))
-    else:
-        await db.execute(
-            """
-            INSERT INTO cases (
-                id, customer_id, title, description, priority,
-                status, alert_ids, created_at, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                case_id,
-                case.customer_id,
-                case.title,
-                case.description,
-                case.priority,
-                "open",
-                json.dumps(case.alert_ids),
-                now,
-                now
-            )
-        )
-        await db.commit()
-        async with db.execute("SELECT * FROM cases WHERE id = ?", (case_id,)) as cursor:
-            row = await cursor.fetchone()
-        return _case_from_row(dict(row))
+        for case in cases
+    ]
+    if rows:
+        await db_strategy.execute_many(db, _INSERT_CASE_SQL, rows)
+    return {"ids": [row[0] for row in rows]}
 
-@router.get("/", response_model=List[CaseResponse])
+@router.get("/", response_model=None, responses={200: {"model": List[CaseResponse]}})
 async def get_cases(
+    request: Request,
     limit: int = Query(default=50, le=100),
     status_filter: Optional[str] = Query(default=None, alias="status"),
     priority: Optional[str] = Query(default=None),
     assigned_to: Optional[str] = Query(default=None),
-    token_data: dict = Depends(verify_token),
-    db = Depends(get_db)
+    token_data: dict = Depends(verify_token)
 ):
     """Get cases with optional filtering"""
-    if IS_POSTGRES:
-        query = "SELECT * FROM cases WHERE 1=1"
-        params = []
-        if status_filter:
-            query += " AND status = $%d" % (len(params)+1)
-            params.append(status_filter)
-        if priority:
-            query += " AND priority = $%d" % (len(params)+1)
-            params.append(priority)
-        if assigned_to:
-            query += " AND assigned_to = $%d" % (len(params)+1)
-            params.append(assigned_to)
-        query += " ORDER BY created_at DESC LIMIT $%d" % (len(params)+1)
-        params.append(limit)
-        rows = await db.fetch(query, *params)
-        return [_case_from_row(dict(row)) for row in rows]
-    else:
-        query = "SELECT * FROM cases WHERE 1=1"
-        params = []
-        if status_filter:
-            query += " AND status = ?"
-            params.append(status_filter)
-        if priority:
-            query += " AND priority = ?"
-            params.append(priority)
-        if assigned_to:
-            query += " AND assigned_to = ?"
-            params.append(assigned_to)
-        query += " ORDER BY created_at DESC LIMIT ?"
-        params.append(limit)
-        async with db.execute(query, params) as cursor:
-            rows = await cursor.fetchall()
-        return [_case_from_row(dict(row)) for row in rows]
+    filters = (status_filter, priority, assigned_to)
+    mask = sum(1 << bit for bit, value in enumerate(filters) if value)
+    if status_filter and status_filter != "closed":
+        mask |= _ACTIVE_ONLY
+    params = [value for value in filters if value]
+    params.append(limit)
+    query = _GET_CASES_SQL[mask]
+    # Rows come from our own schema, so skip response_model validation on list endpoints
+    return json_array_response(stream_rows(request, query, params), _case_from_row)
 
 @router.get("/{case_id}", response_model=CaseResponse)
 async def get_case(
@@ -120,17 +127,10 @@ async def get_case(
     db = Depends(get_db)
 ):
     """Get case by ID"""
-    if IS_POSTGRES:
-        row = await db.fetchrow("SELECT * FROM cases WHERE id = $1", case_id)
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Case not found")
-        return _case_from_row(dict(row))
-    else:
-        async with db.execute("SELECT * FROM cases WHERE id = ?", (case_id,)) as cursor:
-            row = await cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Case not found")
-        return _case_from_row(dict(row))
+    row = await db_strategy.fetch_one(db, CASE_BY_ID_SQL, case_id)
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Case not found")
+    return _case_from_row(row)
 
 @router.patch("/{case_id}", response_model=CaseResponse)
 async def update_case(
@@ -140,70 +140,39 @@ async def update_case(
     db = Depends(get_db)
 ):
     """Update case"""
-    if IS_POSTGRES:
-        row = await db.fetchrow("SELECT * FROM cases WHERE id = $1", case_id)
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Case not found")
-        updates = []
-        params = []
-        update_fields = ["title", "description", "priority", "status", "assigned_to", "findings", "resolution"]
-        for field in update_fields:
-            value = getattr(case_update, field, None)
-            if value is not None:
-                updates.append(f"{field} = ${len(params)+1}")
-                params.append(value)
-        if case_update.status == "closed":
-            updates.append(f"closed_at = ${len(params)+1}")
-            params.append(datetime.utcnow())
-        if updates:
-            updates.append(f"updated_at = ${len(params)+1}")
-            params.append(datetime.utcnow())
-            params.append(case_id)
-            query = f"UPDATE cases SET {', '.join(updates)} WHERE id = ${len(params)}"
-            await db.execute(query, *params)
-        updated_row = await db.fetchrow("SELECT * FROM cases WHERE id = $1", case_id)
-        return _case_from_row(dict(updated_row))
+    now = datetime.utcnow()
+    updates = []
+    params = []
+    update_fields = ["title", "description", "priority", "status", "assigned_to", "findings", "resolution"]
+    for field in update_fields:
+        value = getattr(case_update, field, None)
+        if value is not None:
+            updates.append(f"{field} = ${len(params)+1}")
+            params.append(value)
+    if case_update.status == "closed":
+        updates.append(f"closed_at = ${len(params)+1}")
+        params.append(now)
+    if updates:
+        updates.append(f"updated_at = ${len(params)+1}")
+        params.append(now)
+        params.append(case_id)
+        query = f"UPDATE cases SET {', '.join(updates)} WHERE id = ${len(params)} RETURNING *"
+        row = await db_strategy.fetch_one(db, query, *params)
     else:
-        async with db.execute("SELECT * FROM cases WHERE id = ?", (case_id,)) as cursor:
-            row = await cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Case not found")
-        updates = []
-        params = []
-        update_fields = ["title", "description", "priority", "status", "assigned_to", "findings", "resolution"]
-        for field in update_fields:
-            value = getattr(case_update, field, None)
-            if value is not None:
-                updates.append(f"{field} = ?")
-                params.append(value)
-        if case_update.status == "closed":
-            updates.append("closed_at = ?")
-            params.append(datetime.utcnow())
-        if updates:
-            updates.append("updated_at = ?")
-            params.append(datetime.utcnow())
-            params.append(case_id)
-            query = f"UPDATE cases SET {', '.join(updates)} WHERE id = ?"
-            await db.execute(query, params)
-            await db.commit()
-        async with db.execute("SELECT * FROM cases WHERE id = ?", (case_id,)) as cursor:
-            updated_row = await cursor.fetchone()
-        return _case_from_row(dict(updated_row))
+        row = await db_strategy.fetch_one(db, CASE_BY_ID_SQL, case_id)
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Case not found")
+    return _case_from_row(row)
 
-def _case_from_row(row: dict) -> CaseResponse:
-    """Convert database row to CaseResponse"""
-    return CaseResponse(
-        id=row["id"],
-        customer_id=row["customer_id"],
-        title=row["title"],
-        description=row["description"],
-        priority=row["priority"],
-        status=row["status"],
-        assigned_to=row["assigned_to"],
-        alert_ids=json.loads(row["alert_ids"]) if row["alert_ids"] else [],
-        findings=row["findings"],
-        resolution=row["resolution"],
-        closed_at=row["closed_at"],
-        created_at=row["created_at"],
-        updated_at=row["updated_at"]
-    )
+_CASE_FIELDS = (
+    "id", "customer_id", "title", "description", "priority", "status", "assigned_to",
+    "alert_ids", "findings", "resolution", "closed_at", "created_at", "updated_at"
+)
+# One C-level call pulls every column out of the row
+_case_values = itemgetter(*_CASE_FIELDS)
+
+def _case_from_row(row: Mapping) -> dict:
+    """Convert database row to a CaseResponse-shaped dict"""
+    case = dict(zip(_CASE_FIELDS, _case_values(row)))
+    case["alert_ids"] = load_json_column(case["alert_ids"]) or []
+    return case
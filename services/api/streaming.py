@@ -0,0 +1,32 @@
+"""
+Streaming helpers for list endpoints
+"""
+
+from typing import AsyncIterator, Callable, Mapping
+
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from .database import db_strategy
+
+async def stream_rows(request: Request, query: str, params: list) -> AsyncIterator[Mapping]:
+    """Iterate query results through a cursor instead of fetch()/fetchall()
+
+    get_db's connection is released before a streamed body is sent, so the
+    connection is acquired here and held for the lifetime of the stream.
+    """
+    async for row in db_strategy.iterate(request.app.state, query, *params):
+        yield row
+
+async def _encode_json_array(rows: AsyncIterator[Mapping], convert: Callable[[Mapping], dict]):
+    """Encode rows one at a time into a JSON array body"""
+    separator = b"["
+    async for row in rows:
+        yield separator + orjson.dumps(convert(row))
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+def json_array_response(rows: AsyncIterator[Mapping], convert: Callable[[Mapping], dict]) -> StreamingResponse:
+    """Stream rows as a JSON array, holding at most one prefetch batch in memory"""
+    return StreamingResponse(_encode_json_array(rows, convert), media_type="application/json")
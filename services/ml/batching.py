@@ -0,0 +1,92 @@
+"""
+Request coalescing for model inference
+Concurrent /predict calls are scored together in one batched model call
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+class BatchCoalescer:
+    """Collect single-row predictions into batched, off-loop model calls
+
+    Callers queue a feature vector and await a future. A background task takes
+    up to max_batch_size queued vectors, waiting at most max_wait seconds after
+    the first, stacks them into one matrix, scores it in the default executor so
+    the event loop stays free, and resolves each caller's future.
+    """
+    
+    def __init__(
+        self,
+        predict_matrix: Callable[[np.ndarray], List[Dict[str, Any]]],
+        max_batch_size: int = 256,
+        max_wait: float = 0.002
+    ):
+        self.predict_matrix = predict_matrix
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the batching task on the running loop"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the batching task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def predict(self, features: np.ndarray) -> Dict[str, Any]:
+        """Queue one feature vector and wait for its prediction"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((features, future))
+        return await future
+    
+    async def _collect(self) -> list:
+        """Wait for one request, then gather more until the batch is full or max_wait elapses"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            matrix = np.vstack([features for features, _ in batch])
+            try:
+                predictions = await loop.run_in_executor(None, self.predict_matrix, matrix)
+            except Exception as e:
+                logger.error("Batched prediction failed", error=str(e), batch_size=len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), prediction in zip(batch, predictions):
+                # Callers that went away leave cancelled futures behind
+                if not future.done():
+                    future.set_result(prediction)
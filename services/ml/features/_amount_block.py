@@ -0,0 +1,23 @@
+"""
+Parallel gufunc for the batch amount/structuring feature block
+Kept apart from _jit_fallback so the single-transaction path, which may use
+the ahead-of-time kernels, never compiles it; engineer_features_batch
+imports it on first use
+"""
+
+import numba
+
+from ._jit_fallback import amount_zscore, threshold_flags, structuring_score
+
+@numba.guvectorize(["void(float64, float64, float32[:])"], "(),()->(m)", target="parallel", fastmath=True, cache=True)
+def amount_block(amount, avg_amount, out):
+    """Amount z-score, the seven threshold flags and the structuring score
+
+    Fills the amount_zscore..amount_structuring columns of the batch matrix;
+    the output slice is passed in so the gufunc writes it in place.
+    """
+    out[0] = amount_zscore(amount, avg_amount)
+    flags = threshold_flags(amount)
+    for j in range(7):
+        out[1 + j] = flags[j]
+    out[8] = structuring_score(amount)
@@ -0,0 +1,46 @@
+"""
+JIT-compiled feature kernels
+Used when the ahead-of-time _feature_kernels extension has not been built;
+explicit signatures make numba compile at import rather than on first call
+"""
+
+import numba
+import numpy as np
+
+STRUCTURING_THRESHOLDS = np.array([3000, 5000, 9000, 10000, 15000], dtype=np.float64)
+
+@numba.njit("float64(float64)", cache=True, fastmath=True)
+def structuring_score(amount):
+    """Structuring risk score based on proximity to common reporting thresholds"""
+    score = 0.0
+    for threshold in STRUCTURING_THRESHOLDS:
+        # Higher score if amount is just below threshold
+        if threshold * 0.9 <= amount < threshold:
+            score += 0.3
+        elif threshold * 0.8 <= amount < threshold * 0.9:
+            score += 0.1
+    # Bonus for being near multiple thresholds
+    if score > 0.3:
+        score *= 1.5
+    return min(score, 1.0)
+
+@numba.njit("float64(float64, float64)", cache=True, fastmath=True)
+def amount_zscore(amount, avg_amount):
+    # Assume a 50% std dev around the customer's average
+    return (amount - avg_amount) / max(avg_amount * 0.5, 1.0)
+
+@numba.njit("UniTuple(float64, 7)(float64)", cache=True, fastmath=True)
+def threshold_flags(amount):
+    """Large, very large, round, very round, near CTR, near 5k, near 3k"""
+    # Round-amount checks on integer cents: float modulo misses amounts like
+    # 1000.0000001 that only differ from a round figure by representation error
+    cents = int(round(amount * 100.0))
+    return (
+        1.0 if amount > 10000 else 0.0,
+        1.0 if amount > 50000 else 0.0,
+        1.0 if cents % 10_000 == 0 else 0.0,
+        1.0 if cents % 100_000 == 0 else 0.0,
+        1.0 if 9000 <= amount < 10000 else 0.0,
+        1.0 if 4500 <= amount < 5000 else 0.0,
+        1.0 if 2500 <= amount < 3000 else 0.0,
+    )
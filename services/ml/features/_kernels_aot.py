@@ -0,0 +1,31 @@
+"""
+Ahead-of-time build of the feature kernels
+Run `python -m services.ml.features._kernels_aot` at build time to produce the
+_feature_kernels extension next to this file; engineering.py imports it in
+preference to the JIT fallback, so the scalar kernels aren't compiled at
+startup (the batch path's amount_block gufunc is JIT-compiled on first use)
+"""
+
+from pathlib import Path
+
+from numba.pycc import CC
+
+from . import _jit_fallback as kernels
+
+cc = CC("_feature_kernels")
+cc.output_dir = str(Path(__file__).parent)
+
+@cc.export("structuring_score", "f8(f8)")
+def structuring_score(amount):
+    return kernels.structuring_score(amount)
+
+@cc.export("amount_zscore", "f8(f8, f8)")
+def amount_zscore(amount, avg_amount):
+    return kernels.amount_zscore(amount, avg_amount)
+
+@cc.export("threshold_flags", "UniTuple(f8, 7)(f8)")
+def threshold_flags(amount):
+    return kernels.threshold_flags(amount)
+
+if __name__ == "__main__":
+    cc.compile()
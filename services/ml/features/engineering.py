@@ -6,21 +6,216 @@ Extracts and transforms transaction features for ML models
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
 import structlog
 import asyncio
+import os
 import aiosqlite
 from pathlib import Path
 
+try:
+    # Ahead-of-time build: python -m services.ml.features._kernels_aot
+    from ._feature_kernels import (
+        structuring_score as _structuring_score,
+        amount_zscore as _amount_zscore,
+        threshold_flags as _threshold_flags,
+    )
+except ImportError:
+    from ._jit_fallback import (
+        structuring_score as _structuring_score,
+        amount_zscore as _amount_zscore,
+        threshold_flags as _threshold_flags,
+    )
+
 logger = structlog.get_logger()
 
+# Column order of the matrix returned by engineer_features_batch
+FEATURE_NAMES = (
+    "amount_log", "amount_raw",
+    "is_wire_transfer", "is_cash_transaction", "is_online_transfer", "is_card_payment", "currency_risk",
+    "hour_of_day", "day_of_week", "is_weekend", "is_business_hours", "is_late_night",
+    "geographic_risk", "is_high_risk_country", "is_sanctioned_country",
+    "customer_age_days", "avg_transaction_amount", "transaction_frequency",
+    "total_transactions", "account_age_days",
+    "amount_zscore", "is_large_amount", "is_very_large_amount",
+    "is_round_amount", "is_very_round_amount",
+    "near_ctr_threshold", "near_5k_threshold", "near_3k_threshold", "amount_structuring",
+    "velocity_1h", "velocity_24h", "velocity_7d",
+)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+# First column of each feature group; every group is contiguous in FEATURE_NAMES
+IDX_BASIC = FEATURE_INDEX["amount_log"]
+IDX_TEMPORAL = FEATURE_INDEX["hour_of_day"]
+IDX_GEOGRAPHIC = FEATURE_INDEX["geographic_risk"]
+IDX_CUSTOMER = FEATURE_INDEX["customer_age_days"]
+IDX_AMOUNT = FEATURE_INDEX["amount_zscore"]
+IDX_VELOCITY = FEATURE_INDEX["velocity_1h"]
+
+SANCTIONED_COUNTRIES = {"IR", "KP", "SY", "RU"}
+
+# Profile history source, shared with the API service
+DATABASE_PATH = Path(os.getenv("DATABASE_URL", "data/amlguard.db").replace("sqlite:///", "").replace("sqlite://", ""))
+SQLITE_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-64000;
+"""
+
+# Customer profiles live in parallel column arrays that double when full
+PROFILE_INITIAL_CAPACITY = 1024
+PROFILE_COLUMNS = (
+    "_prof_age_days", "_prof_avg_amount", "_prof_frequency", "_prof_count",
+    "_prof_account_age_days", "_prof_risk_history",
+)
+
+# transaction_type values the producers emit; their flags are precomputed
+KNOWN_TRANSACTION_TYPES = (
+    "Wire Transfer", "ACH Transfer", "Card Payment", "ATM Withdrawal",
+    "Online Transfer", "Check Deposit", "Cash Deposit", "International Transfer",
+)
+
+def _txn_type_flags_from_substrings(txn_type: str) -> tuple:
+    """(is_wire, is_cash, is_online, is_card) for a lowercased transaction type"""
+    return (
+        1.0 if "wire" in txn_type else 0.0,
+        1.0 if "cash" in txn_type or "atm" in txn_type else 0.0,
+        1.0 if "online" in txn_type else 0.0,
+        1.0 if "card" in txn_type else 0.0,
+    )
+
+# Synthetic profile/velocity draws come from pools sampled once at startup
+RANDOM_POOL_SIZE = 1 << 16
+RANDOM_POOL_MASK = RANDOM_POOL_SIZE - 1
+
+# Scalar feature writers; plain functions over prepacked values so the hot
+# path skips attribute lookups on self and transaction_data
+
+def _write_basic_features(features: np.ndarray, amount: float, categorical: tuple):
+    """Log-scaled and raw amount, transaction type flags, currency risk"""
+    features[IDX_BASIC] = np.log1p(amount)
+    features[IDX_BASIC + 1] = amount
+    features[IDX_BASIC + 2:IDX_BASIC + 7] = categorical[:5]
+
+def _write_temporal_features(features: np.ndarray, hour: int, weekday: int):
+    """Hour, day of week (0=Monday) and time-of-week indicators"""
+    features[IDX_TEMPORAL:IDX_TEMPORAL + 5] = (
+        hour,
+        weekday,
+        weekday >= 5,                     # Weekend
+        weekday < 5 and 9 <= hour <= 17,  # Business hours (9 AM - 5 PM weekdays)
+        hour >= 22 or hour <= 6,          # Late night (10 PM - 6 AM)
+    )
+
+def _write_geographic_features(features: np.ndarray, categorical: tuple):
+    """Country risk score, high-risk and sanctions (simplified) indicators"""
+    features[IDX_GEOGRAPHIC:IDX_GEOGRAPHIC + 3] = categorical[5:]
+
+def _write_amount_features(features: np.ndarray, amount: float, avg_amount: float):
+    """Amount z-score, large/round/threshold-proximity flags, structuring score"""
+    features[IDX_AMOUNT] = _amount_zscore(amount, avg_amount)
+    features[IDX_AMOUNT + 1:IDX_AMOUNT + 8] = _threshold_flags(amount)
+    features[IDX_AMOUNT + 8] = _structuring_score(amount)
+
 class FeatureEngineeer:
     """Feature engineering for AML risk scoring"""
     
+    # Fixed attribute set: slot descriptors instead of a per-instance __dict__
+    __slots__ = (
+        "_db", "_db_lock",
+        "geographic_risk_scores", "currency_risk_scores",
+        "_currency_codes", "_currency_risk_lut",
+        "_country_to_id", "_geo_risk_lut", "_is_high_risk_lut", "_is_sanctioned_lut",
+        "_txn_type_flags", "_classify",
+        "_cid_to_row", *PROFILE_COLUMNS,
+        "_rand_age_days", "_rand_avg_amount", "_rand_frequency", "_rand_total_count",
+        "_rand_account_age_days", "_rand_risk_history",
+        "_rand_velocity_1h", "_rand_velocity_24h", "_rand_velocity_7d",
+        "_profile_draws", "_velocity_draws",
+    )
+    
     def __init__(self):
-        self.customer_profiles = {}
+        self._init_profile_store()
+        # One long-lived connection for profile lookups, opened on first use
+        self._db: Optional[aiosqlite.Connection] = None
+        self._db_lock = asyncio.Lock()
         self.geographic_risk_scores = self._load_geographic_risks()
         self.currency_risk_scores = self._load_currency_risks()
+        # Batch path: strings map to small int codes once, scores are read with np.take.
+        # The extra trailing slot holds the score for codes not in the table.
+        self._currency_codes = {c: i for i, c in enumerate(self.currency_risk_scores)}
+        self._currency_risk_lut = np.array([*self.currency_risk_scores.values(), 0.5], dtype=np.float32)
+        self._country_to_id = {c: i for i, c in enumerate(self.geographic_risk_scores)}
+        self._geo_risk_lut = np.array([*self.geographic_risk_scores.values(), 0.5], dtype=np.float32)
+        self._is_high_risk_lut = (self._geo_risk_lut > 0.5).astype(np.float32)
+        self._is_sanctioned_lut = np.array(
+            [c in SANCTIONED_COUNTRIES for c in self.geographic_risk_scores] + [False], dtype=np.float32
+        )
+        self._txn_type_flags = {
+            t.lower(): _txn_type_flags_from_substrings(t.lower()) for t in KNOWN_TRANSACTION_TYPES
+        }
+        self._init_random_pools()
+        # Real traffic has few distinct (type, currency, country) triples, so the
+        # categorical features are derived once per triple
+        self._classify = lru_cache(maxsize=512)(self._classify_uncached)
+        
+    async def _get_db(self) -> aiosqlite.Connection:
+        """Shared SQLite connection, so profile builds reuse its page cache"""
+        
+        if self._db is None:
+            async with self._db_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(DATABASE_PATH)
+                    db.row_factory = aiosqlite.Row
+                    await db.executescript(SQLITE_PRAGMAS)
+                    self._db = db
+        return self._db
+    
+    async def close(self):
+        """Close the shared connection"""
+        
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+    
+    def _init_profile_store(self):
+        """Allocate the columnar profile store; _cid_to_row maps a customer to its row"""
+        
+        capacity = PROFILE_INITIAL_CAPACITY
+        self._cid_to_row: Dict[str, int] = {}
+        self._prof_age_days = np.empty(capacity, dtype=np.int32)
+        self._prof_avg_amount = np.empty(capacity, dtype=np.float64)  # Running mean, kept in float64
+        self._prof_frequency = np.empty(capacity, dtype=np.float32)
+        self._prof_count = np.empty(capacity, dtype=np.int32)
+        self._prof_account_age_days = np.empty(capacity, dtype=np.int32)
+        self._prof_risk_history = np.empty((capacity, 10), dtype=np.float32)
+        
+    def _grow_profile_store(self):
+        """Double the capacity of every profile column"""
+        
+        for name in PROFILE_COLUMNS:
+            column = getattr(self, name)
+            grown = np.empty((column.shape[0] * 2, *column.shape[1:]), dtype=column.dtype)
+            grown[:column.shape[0]] = column
+            setattr(self, name, grown)
+        
+    def _init_random_pools(self):
+        """Sample every synthetic distribution once; requests index into the pools"""
+        
+        size = RANDOM_POOL_SIZE
+        self._rand_age_days = np.random.randint(30, 1825, size)  # 1 month to 5 years
+        self._rand_avg_amount = np.random.lognormal(6, 1, size)  # ~$400 average
+        self._rand_frequency = np.random.poisson(5, size)        # ~5 transactions per month
+        self._rand_total_count = np.random.randint(10, 500, size)
+        self._rand_account_age_days = np.random.randint(30, 2000, size)
+        self._rand_risk_history = np.random.beta(2, 8, (size, 10))  # Historical risk scores
+        self._rand_velocity_1h = np.random.exponential(1.0, size)
+        self._rand_velocity_24h = np.random.exponential(3.0, size)
+        self._rand_velocity_7d = np.random.exponential(10.0, size)
+        # Running draw counters, wrapped into the pools with RANDOM_POOL_MASK
+        self._profile_draws = 0
+        self._velocity_draws = 0
         
     def _load_geographic_risks(self) -> Dict[str, float]:
         """Load geographic risk scores for countries"""
@@ -40,235 +235,207 @@ class FeatureEngineeer:
             "ETH": 0.7, "XMR": 0.9, "ZEC": 0.9
         }
     
-    async def engineer_features(self, transaction_data) -> Dict[str, float]:
-        """Engineer features for a transaction"""
+    async def engineer_features(self, transaction_data) -> np.ndarray:
+        """Engineer features for a transaction
+
+        Fields are read and coerced once up front; every group is then written
+        straight into one float32 vector whose columns match FEATURE_NAMES.
+        """
         
-        features = {}
+        features = np.empty(len(FEATURE_NAMES), dtype=np.float32)
+        amount = float(transaction_data.amount)
+        customer_id = transaction_data.customer_id
+        timestamp = transaction_data.timestamp or datetime.utcnow()
+        location = transaction_data.location or {}
+        categorical = self._classify(
+            transaction_data.transaction_type.lower(),
+            transaction_data.currency,
+            location.get("country", "US"),
+        )
         
         # Basic transaction features
-        features.update(self._extract_basic_features(transaction_data))
+        _write_basic_features(features, amount, categorical)
         
         # Temporal features
-        features.update(self._extract_temporal_features(transaction_data))
+        _write_temporal_features(features, timestamp.hour, timestamp.weekday())
         
         # Geographic features
-        features.update(self._extract_geographic_features(transaction_data))
+        _write_geographic_features(features, categorical)
         
         # Customer behavior features
-        features.update(await self._extract_customer_features(transaction_data))
+        row = self._cid_to_row.get(customer_id)
+        if row is None:
+            row = await self._build_customer_profile(customer_id)
+        self._write_customer_features(features, row)
         
-        # Amount-based features
-        features.update(self._extract_amount_features(transaction_data))
-        
-        # Structuring detection features
-        features.update(self._extract_structuring_features(transaction_data))
-        
-        return features
-    
-    def _extract_basic_features(self, transaction_data) -> Dict[str, float]:
-        """Extract basic transaction features"""
-        
-        features = {}
-        
-        # Transaction amount (log-scaled)
-        amount = float(transaction_data.amount)
-        features["amount_log"] = np.log1p(amount)
-        features["amount_raw"] = amount
-        
-        # Currency risk
-        currency = transaction_data.currency
-        features["currency_risk"] = self.currency_risk_scores.get(currency, 0.5)
-        
-        # Transaction type encoding
-        txn_type = transaction_data.transaction_type.lower()
-        features["is_wire_transfer"] = 1.0 if "wire" in txn_type else 0.0
-        features["is_cash_transaction"] = 1.0 if "cash" in txn_type or "atm" in txn_type else 0.0
-        features["is_online_transfer"] = 1.0 if "online" in txn_type else 0.0
-        features["is_card_payment"] = 1.0 if "card" in txn_type else 0.0
+        # Amount-based and structuring features
+        _write_amount_features(features, amount, float(self._prof_avg_amount[row]))
+        self._write_velocity_features(features)
         
         return features
     
-    def _extract_temporal_features(self, transaction_data) -> Dict[str, float]:
-        """Extract time-based features"""
-        
-        features = {}
-        
-        timestamp = transaction_data.timestamp or datetime.utcnow()
-        
-        # Hour of day (0-23)
-        hour = timestamp.hour
-        features["hour_of_day"] = hour
-        
-        # Day of week (0=Monday, 6=Sunday)
-        features["day_of_week"] = timestamp.weekday()
-        
-        # Weekend indicator
-        features["is_weekend"] = 1.0 if timestamp.weekday() >= 5 else 0.0
-        
-        # Business hours (9 AM - 5 PM weekdays)
-        is_business_hours = (
-            timestamp.weekday() < 5 and 
-            9 <= hour <= 17
+    async def engineer_features_batch(self, transactions) -> np.ndarray:
+        """Engineer features for many transactions at once
+
+        Returns an (N, len(FEATURE_NAMES)) float32 matrix whose columns match
+        FEATURE_NAMES and hold the same values engineer_features would produce.
+        """
+        n = len(transactions)
+        out = np.empty((n, len(FEATURE_NAMES)), dtype=np.float32)
+        col = FEATURE_INDEX
+
+        # Basic transaction features
+        amounts = np.fromiter((float(t.amount) for t in transactions), dtype=np.float64, count=n)
+        out[:, col["amount_log"]] = np.log1p(amounts)
+        out[:, col["amount_raw"]] = amounts
+        currency_codes = self._currency_codes
+        currency_ids = np.fromiter(
+            (currency_codes.get(t.currency, -1) for t in transactions), dtype=np.int8, count=n
+        )
+        out[:, col["currency_risk"]] = np.take(self._currency_risk_lut, currency_ids)
+        # The four type flags are adjacent columns in FEATURE_NAMES
+        type_flags = self._type_flags
+        out[:, col["is_wire_transfer"]:col["is_card_payment"] + 1] = [
+            type_flags(t.transaction_type.lower()) for t in transactions
+        ]
+
+        # Temporal features; wall-clock time as in engineer_features
+        now = datetime.utcnow()
+        timestamps = np.array(
+            [(t.timestamp or now).replace(tzinfo=None) for t in transactions], dtype="datetime64[s]"
+        )
+        days = timestamps.astype("datetime64[D]")
+        hours = (timestamps.astype("datetime64[h]") - days).astype(np.int8)
+        weekdays = ((days.astype(np.int64) + 3) % 7).astype(np.int8)  # 1970-01-01 was a Thursday
+        out[:, col["hour_of_day"]] = hours
+        out[:, col["day_of_week"]] = weekdays
+        out[:, col["is_weekend"]] = weekdays >= 5
+        out[:, col["is_business_hours"]] = (weekdays < 5) & (hours >= 9) & (hours <= 17)
+        out[:, col["is_late_night"]] = (hours >= 22) | (hours <= 6)
+
+        # Geographic features
+        country_to_id = self._country_to_id
+        country_ids = np.fromiter(
+            (country_to_id.get((t.location or {}).get("country", "US"), -1) for t in transactions),
+            dtype=np.int8, count=n
+        )
+        out[:, col["geographic_risk"]] = np.take(self._geo_risk_lut, country_ids)
+        out[:, col["is_high_risk_country"]] = np.take(self._is_high_risk_lut, country_ids)
+        out[:, col["is_sanctioned_country"]] = np.take(self._is_sanctioned_lut, country_ids)
+
+        # Customer behavior features
+        cid_to_row = self._cid_to_row
+        for customer_id in {t.customer_id for t in transactions}:
+            if customer_id not in cid_to_row:
+                await self._build_customer_profile(customer_id)
+        rows = np.fromiter((cid_to_row[t.customer_id] for t in transactions), dtype=np.intp, count=n)
+        avg_amounts = self._prof_avg_amount[rows]
+        out[:, col["customer_age_days"]] = self._prof_age_days[rows]
+        out[:, col["avg_transaction_amount"]] = avg_amounts
+        out[:, col["transaction_frequency"]] = self._prof_frequency[rows]
+        out[:, col["total_transactions"]] = self._prof_count[rows]
+        out[:, col["account_age_days"]] = self._prof_account_age_days[rows]
+
+        # Amount-based and structuring features are adjacent columns, filled
+        # by one parallel gufunc call. gufuncs can't be compiled ahead of time
+        # with numba.pycc, so it is imported (and JIT-compiled) on first batch
+        from ._amount_block import amount_block
+        amount_block(amounts, avg_amounts, out[:, col["amount_zscore"]:col["amount_structuring"] + 1])
+        draws = (self._velocity_draws + np.arange(n)) & RANDOM_POOL_MASK
+        self._velocity_draws += n
+        out[:, col["velocity_1h"]] = self._rand_velocity_1h[draws]
+        out[:, col["velocity_24h"]] = self._rand_velocity_24h[draws]
+        out[:, col["velocity_7d"]] = self._rand_velocity_7d[draws]
+
+        return out
+
+    def _classify_uncached(self, txn_type: str, currency: str, country: str) -> tuple:
+        """Categorical features for one lowercased type, currency and country
+
+        Returns (is_wire, is_cash, is_online, is_card, currency_risk,
+        geographic_risk, is_high_risk_country, is_sanctioned_country).
+        """
+        country_id = self._country_to_id.get(country, -1)
+        return (
+            *self._type_flags(txn_type),
+            self.currency_risk_scores.get(currency, 0.5),
+            float(self._geo_risk_lut[country_id]),
+            float(self._is_high_risk_lut[country_id]),
+            float(self._is_sanctioned_lut[country_id]),
         )
-        features["is_business_hours"] = 1.0 if is_business_hours else 0.0
-        
-        # Late night hours (10 PM - 6 AM)
-        is_late_night = hour >= 22 or hour <= 6
-        features["is_late_night"] = 1.0 if is_late_night else 0.0
-        
-        return features
-    
-    def _extract_geographic_features(self, transaction_data) -> Dict[str, float]:
-        """Extract geography-based features"""
-        
-        features = {}
-        
-        location = transaction_data.location or {}
-        country = location.get("country", "US")
-        
-        # Country risk score
-        features["geographic_risk"] = self.geographic_risk_scores.get(country, 0.5)
-        
-        # High-risk country indicator
-        features["is_high_risk_country"] = 1.0 if features["geographic_risk"] > 0.5 else 0.0
-        
-        # Sanctions country indicator (simplified)
-        sanctioned_countries = {"IR", "KP", "SY", "RU"}
-        features["is_sanctioned_country"] = 1.0 if country in sanctioned_countries else 0.0
-        
-        return features
-    
-    async def _extract_customer_features(self, transaction_data) -> Dict[str, float]:
-        """Extract customer behavior features"""
-        
-        features = {}
-        customer_id = transaction_data.customer_id
-        
-        # Get or create customer profile
-        if customer_id not in self.customer_profiles:
-            self.customer_profiles[customer_id] = await self._build_customer_profile(customer_id)
-        
-        profile = self.customer_profiles[customer_id]
-        
-        # Customer age (days since first transaction)
-        features["customer_age_days"] = profile.get("age_days", 0)
-        
-        # Historical transaction statistics
-        features["avg_transaction_amount"] = profile.get("avg_amount", 1000.0)
-        features["transaction_frequency"] = profile.get("frequency", 1.0)
-        features["total_transactions"] = profile.get("total_count", 1)
-        
-        # Account age (simplified)
-        features["account_age_days"] = profile.get("account_age_days", 30)
-        
-        return features
     
-    async def _build_customer_profile(self, customer_id: str) -> Dict[str, Any]:
-        """Build customer profile from historical data"""
-        
-        # In a real implementation, this would query the database
-        # For now, return synthetic profile data
-        
-        profile = {
-            "age_days": np.random.randint(30, 1825),  # 1 month to 5 years
-            "avg_amount": np.random.lognormal(6, 1),  # ~$400 average
-            "frequency": np.random.poisson(5),        # ~5 transactions per month
-            "total_count": np.random.randint(10, 500),
-            "account_age_days": np.random.randint(30, 2000),
-            "risk_score_history": np.random.beta(2, 8, 10).tolist()  # Historical risk scores
-        }
-        
-        return profile
+    def _type_flags(self, txn_type: str) -> tuple:
+        """Flags for a lowercased type; substring scans only for unknown types"""
+        flags = self._txn_type_flags.get(txn_type)
+        if flags is None:
+            flags = _txn_type_flags_from_substrings(txn_type)
+        return flags
     
-    def _extract_amount_features(self, transaction_data) -> Dict[str, float]:
-        """Extract amount-based features"""
-        
-        features = {}
-        amount = float(transaction_data.amount)
-        customer_id = transaction_data.customer_id
-        
-        # Get customer profile for comparison
-        profile = self.customer_profiles.get(customer_id, {"avg_amount": 1000.0})
-        avg_amount = profile["avg_amount"]
-        
-        # Amount z-score (how unusual is this amount for this customer)
-        amount_std = avg_amount * 0.5  # Assume 50% std dev
-        features["amount_zscore"] = (amount - avg_amount) / max(amount_std, 1.0)
-        
-        # Large amount indicators
-        features["is_large_amount"] = 1.0 if amount > 10000 else 0.0
-        features["is_very_large_amount"] = 1.0 if amount > 50000 else 0.0
-        
-        # Round amount indicators (potential structuring)
-        features["is_round_amount"] = 1.0 if amount % 100 == 0 else 0.0
-        features["is_very_round_amount"] = 1.0 if amount % 1000 == 0 else 0.0
-        
-        return features
+    def _write_customer_features(self, features: np.ndarray, row: int):
+        """Customer age, historical statistics and account age (simplified)"""
+        
+        features[IDX_CUSTOMER] = self._prof_age_days[row]
+        features[IDX_CUSTOMER + 1] = self._prof_avg_amount[row]
+        features[IDX_CUSTOMER + 2] = self._prof_frequency[row]
+        features[IDX_CUSTOMER + 3] = self._prof_count[row]
+        features[IDX_CUSTOMER + 4] = self._prof_account_age_days[row]
     
-    def _extract_structuring_features(self, transaction_data) -> Dict[str, float]:
-        """Extract features related to structuring detection"""
-        
-        features = {}
-        amount = float(transaction_data.amount)
-        
-        # CTR threshold proximity (US: $10,000)
-        ctr_threshold = 10000
-        features["near_ctr_threshold"] = 1.0 if 9000 <= amount < ctr_threshold else 0.0
-        
-        # Multiple threshold proximity
-        features["near_5k_threshold"] = 1.0 if 4500 <= amount < 5000 else 0.0
-        features["near_3k_threshold"] = 1.0 if 2500 <= amount < 3000 else 0.0
-        
-        # Structuring amount patterns
-        features["amount_structuring"] = self._calculate_structuring_score(amount)
-        
-        # Velocity features (would be calculated from recent transaction history)
-        # For now, use simplified estimates
-        features["velocity_1h"] = np.random.exponential(1.0)    # Txns in last hour
-        features["velocity_24h"] = np.random.exponential(3.0)   # Txns in last 24h
-        features["velocity_7d"] = np.random.exponential(10.0)   # Txns in last 7 days
-        
-        return features
+    async def _build_customer_profile(self, customer_id: str) -> int:
+        """Build customer profile from historical data and return its row"""
+        
+        # In a real implementation, this would query the database through
+        # self._get_db(). For now, fill the row with synthetic profile data
+        
+        cid_to_row = self._cid_to_row
+        row = len(cid_to_row)
+        if row == self._prof_count.shape[0]:
+            self._grow_profile_store()
+        
+        i = self._profile_draws & RANDOM_POOL_MASK
+        self._profile_draws += 1
+        self._prof_age_days[row] = self._rand_age_days[i]
+        self._prof_avg_amount[row] = self._rand_avg_amount[i]
+        self._prof_frequency[row] = self._rand_frequency[i]
+        self._prof_count[row] = self._rand_total_count[i]
+        self._prof_account_age_days[row] = self._rand_account_age_days[i]
+        self._prof_risk_history[row] = self._rand_risk_history[i]
+        cid_to_row[customer_id] = row
+        
+        return row
     
-    def _calculate_structuring_score(self, amount: float) -> float:
-        """Calculate structuring risk score based on amount"""
-        
-        # Common structuring thresholds
-        thresholds = [3000, 5000, 9000, 10000, 15000]
-        
-        structuring_score = 0.0
-        
-        for threshold in thresholds:
-            # Higher score if amount is just below threshold
-            if threshold * 0.9 <= amount < threshold:
-                structuring_score += 0.3
-            elif threshold * 0.8 <= amount < threshold * 0.9:
-                structuring_score += 0.1
-        
-        # Bonus for being near multiple thresholds
-        if structuring_score > 0.3:
-            structuring_score *= 1.5
-        
-        return min(structuring_score, 1.0)
+    def _write_velocity_features(self, features: np.ndarray):
+        """Transactions in the last hour, 24h and 7 days"""
+        
+        # Would be calculated from recent transaction history;
+        # for now, use simplified estimates
+        i = self._velocity_draws & RANDOM_POOL_MASK
+        self._velocity_draws += 1
+        features[IDX_VELOCITY] = self._rand_velocity_1h[i]
+        features[IDX_VELOCITY + 1] = self._rand_velocity_24h[i]
+        features[IDX_VELOCITY + 2] = self._rand_velocity_7d[i]
     
     async def update_customer_profile(self, customer_id: str, transaction_data):
         """Update customer profile with new transaction"""
         
-        if customer_id not in self.customer_profiles:
-            self.customer_profiles[customer_id] = await self._build_customer_profile(customer_id)
-        
-        profile = self.customer_profiles[customer_id]
+        row = self._cid_to_row.get(customer_id)
+        if row is None:
+            row = await self._build_customer_profile(customer_id)
         
         # Update running averages (simplified)
-        current_avg = profile["avg_amount"]
         new_amount = float(transaction_data.amount)
-        count = profile["total_count"]
+        count = int(self._prof_count[row])
         
         # Update average amount
-        profile["avg_amount"] = (current_avg * count + new_amount) / (count + 1)
-        profile["total_count"] = count + 1
+        avg_amount = (float(self._prof_avg_amount[row]) * count + new_amount) / (count + 1)
+        self._prof_avg_amount[row] = avg_amount
+        self._prof_count[row] = count + 1
         
         # Update frequency (transactions per day)
-        profile["frequency"] = profile["total_count"] / max(profile["age_days"], 1)
+        self._prof_frequency[row] = (count + 1) / max(int(self._prof_age_days[row]), 1)
         
-        logger.debug("Updated customer profile", customer_id=customer_id, profile=profile)
+        logger.debug(
+            "Updated customer profile",
+            customer_id=customer_id,
+            avg_amount=avg_amount,
+            total_count=count + 1,
+        )
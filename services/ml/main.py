@@ -5,6 +5,7 @@ Machine Learning service for risk scoring and anomaly detection
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 import structlog
@@ -14,9 +15,11 @@ import pandas as pd
 from datetime import datetime, timedelta
 from pathlib import Path
 import os
+from collections import OrderedDict
 
+from .batching import BatchCoalescer
 from .models.ensemble import EnsembleRiskModel
-from .features.engineering import FeatureEngineeer
+from .features.engineering import FeatureEngineeer, FEATURE_INDEX
 
 # Configure structured logging
 structlog.configure(
@@ -42,7 +45,8 @@ logger = structlog.get_logger()
 app = FastAPI(
     title="AMLGuard ML Service",
     description="Machine Learning service for AML risk scoring and anomaly detection",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -58,11 +62,22 @@ app.add_middleware(
 ensemble_model = EnsembleRiskModel()
 feature_engineer = FeatureEngineeer()
 
+# Concurrent /predict calls share one batched model call, run off the event loop
+prediction_coalescer = BatchCoalescer(
+    lambda matrix: ensemble_model.predict_matrix(matrix, FEATURE_INDEX),
+    max_batch_size=int(os.getenv("PREDICT_BATCH_SIZE", "256")),
+    max_wait=float(os.getenv("PREDICT_BATCH_WAIT_MS", "2")) / 1000
+)
+
+# Retried submissions of the same transaction reuse the earlier prediction
+PREDICTION_CACHE_SIZE = 10_000
+_prediction_cache: "OrderedDict[tuple, RiskPrediction]" = OrderedDict()
+
 # Pydantic models
 class TransactionData(BaseModel):
     transaction_id: str
     customer_id: str
-    account_id: str
+    account_id: Optional[str] = None  # Not used by the features; stream records may lack it
     amount: float = Field(..., gt=0)
     currency: str = "USD"
     transaction_type: str
@@ -101,6 +116,13 @@ async def startup_event():
     # Train or load models
     await ensemble_model.initialize()
     logger.info("ML models initialized successfully")
+    prediction_coalescer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop request batching and release the feature engineer's database connection"""
+    await prediction_coalescer.stop()
+    await feature_engineer.close()
 
 @app.get("/")
 async def root():
@@ -132,38 +154,77 @@ async def predict_risk(transaction: TransactionData):
     if not ensemble_model.is_ready():
         raise HTTPException(status_code=503, detail="ML models are not ready")
     
+    cache_key = (
+        transaction.transaction_id, transaction.amount, transaction.currency, transaction.transaction_type
+    )
+    cached = _prediction_cache.get(cache_key)
+    if cached is not None:
+        _prediction_cache.move_to_end(cache_key)
+        return cached
+    
     try:
         # Engineer features
         features = await feature_engineer.engineer_features(transaction)
         
         # Get prediction from ensemble model
-        prediction = await ensemble_model.predict(features)
+        prediction = await prediction_coalescer.predict(features)
         
-        # Determine risk level
-        risk_level = "low"
-        if prediction["risk_score"] >= 7.0:
-            risk_level = "critical"
-        elif prediction["risk_score"] >= 4.0:
-            risk_level = "medium"
-        
-        # Generate explanation
-        explanation = _generate_explanation(prediction["feature_importance"], prediction["risk_score"])
-        
-        return RiskPrediction(
-            transaction_id=transaction.transaction_id,
-            risk_score=prediction["risk_score"],
-            risk_level=risk_level,
-            confidence=prediction["confidence"],
-            feature_importance=prediction["feature_importance"],
-            model_version=ensemble_model.get_version(),
-            prediction_timestamp=datetime.utcnow(),
-            explanation=explanation
-        )
+        result = _build_prediction(transaction, prediction, datetime.utcnow())
+        _prediction_cache[cache_key] = result
+        if len(_prediction_cache) > PREDICTION_CACHE_SIZE:
+            _prediction_cache.popitem(last=False)
+        return result
         
     except Exception as e:
         logger.error("Prediction failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@app.post("/predict_batch", response_model=List[RiskPrediction])
+async def predict_risk_batch(transactions: List[TransactionData]):
+    """Predict risk scores for many transactions in one vectorized pass"""
+    
+    if not ensemble_model.is_ready():
+        raise HTTPException(status_code=503, detail="ML models are not ready")
+    if not transactions:
+        return []
+    
+    try:
+        feature_matrix = await feature_engineer.engineer_features_batch(transactions)
+        predictions = await ensemble_model.predict_batch(feature_matrix, FEATURE_INDEX)
+        now = datetime.utcnow()
+        return [
+            _build_prediction(transaction, prediction, now)
+            for transaction, prediction in zip(transactions, predictions)
+        ]
+        
+    except Exception as e:
+        logger.error("Batch prediction failed", error=str(e), batch_size=len(transactions))
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+def _build_prediction(transaction: TransactionData, prediction: Dict[str, Any], timestamp: datetime) -> RiskPrediction:
+    """Shape an ensemble prediction into the API response"""
+    
+    # Determine risk level
+    risk_level = "low"
+    if prediction["risk_score"] >= 7.0:
+        risk_level = "critical"
+    elif prediction["risk_score"] >= 4.0:
+        risk_level = "medium"
+    
+    # Generate explanation
+    explanation = _generate_explanation(prediction["feature_importance"], prediction["risk_score"])
+    
+    return RiskPrediction(
+        transaction_id=transaction.transaction_id,
+        risk_score=prediction["risk_score"],
+        risk_level=risk_level,
+        confidence=prediction["confidence"],
+        feature_importance=prediction["feature_importance"],
+        model_version=ensemble_model.get_version(),
+        prediction_timestamp=timestamp,
+        explanation=explanation
+    )
+
 @app.get("/model/metrics", response_model=List[ModelMetrics])
 async def get_model_metrics():
     """Get performance metrics for all models"""
@@ -198,6 +259,7 @@ async def retrain_models():
     """Trigger model retraining (for production use)"""
     try:
         await ensemble_model.retrain()
+        _prediction_cache.clear()
         return {"message": "Model retraining initiated", "status": "success"}
     except Exception as e:
         logger.error("Model retraining failed", error=str(e))
@@ -222,11 +284,17 @@ def _generate_explanation(feature_importance: Dict[str, float], risk_score: floa
     
     explanations = []
     
-    # Sort features by importance
-    sorted_features = sorted(feature_importance.items(), key=lambda x: abs(x[1]), reverse=True)
+    # Take top 3 most important features: partition out the top k in O(F),
+    # then order just those k
+    names = list(feature_importance)
+    magnitudes = np.abs(np.fromiter(feature_importance.values(), dtype=np.float64, count=len(names)))
+    k = min(3, len(names))
+    top = np.argpartition(-magnitudes, k - 1)[:k] if k else []
+    top = sorted(top, key=lambda i: -magnitudes[i])
     
-    # Take top 3 most important features
-    for feature, importance in sorted_features[:3]:
+    for i in top:
+        feature = names[i]
+        importance = feature_importance[feature]
         if abs(importance) < 0.01:  # Skip very low importance features
             continue
             
@@ -0,0 +1,87 @@
+"""
+JIT-compiled tree-ensemble kernels
+Forests are flattened once into stacked node arrays (one row per tree), so
+scoring is a tight loop instead of sklearn's per-call dispatch and validation
+"""
+
+import numba
+import numpy as np
+from numba import types
+
+def _forest_signature(readonly: bool):
+    """iforest_path_lengths' signature; memory-mapped forests arrive as read-only arrays"""
+    def array(dtype, ndim):
+        return types.Array(dtype, ndim, "A", readonly=readonly)
+    return types.float64[:](
+        types.Array(types.float32, 2, "A"),
+        array(types.int32, 2), array(types.float64, 2), array(types.int32, 3), array(types.float64, 2)
+    )
+
+@numba.njit([_forest_signature(False), _forest_signature(True)], cache=True)
+def iforest_path_lengths(X, feature, threshold, children, leaf_depth):
+    """Isolation path length of each row, summed over all trees
+
+    children[t, node] holds (left, right) with -1 at leaves, and leaf_depth
+    holds each leaf's depth plus the average path length of its samples, as in
+    IsolationForest.score_samples. Rows go left when x <= threshold.
+    """
+    n = X.shape[0]
+    out = np.zeros(n)
+    for i in range(n):
+        total = 0.0
+        for t in range(feature.shape[0]):
+            node = 0
+            while children[t, node, 0] != -1:
+                node = children[t, node, 1 if X[i, feature[t, node]] > threshold[t, node] else 0]
+            total += leaf_depth[t, node]
+        out[i] = total
+    return out
+
+@numba.njit(
+    "float64[:](uint16[:, :], int8[:, :], uint16[:, :], int16[:, :, :], float32[:, :], int64, float64)",
+    cache=True, fastmath=True, boundscheck=False
+)
+def gbdt_margins(bins, feature, rank, children, value, depth, base_margin):
+    """Boosted-tree margin of each row, on rank-quantized inputs
+
+    bins[i, f] counts the feature's split thresholds <= x, and rank[t, node]
+    is the threshold's position among them, so a row goes left (x < threshold,
+    as in XGBoost) exactly when bins <= rank. All trees advance one level per
+    pass with a predicated update, so the inner loop over trees has a fixed
+    trip count and no data-dependent exit, which lets LLVM vectorize it.
+    Leaves point at themselves (children[t, leaf] == (leaf, leaf)), so trees
+    shallower than depth just stay put. Inputs are never missing, so default
+    directions aren't needed.
+    """
+    n = bins.shape[0]
+    n_trees = feature.shape[0]
+    out = np.empty(n)
+    node = np.zeros(n_trees, dtype=np.int16)
+    for i in range(n):
+        node[:] = 0
+        for _ in range(depth):
+            for t in range(n_trees):
+                k = node[t]
+                node[t] = children[t, k, 0 if bins[i, feature[t, k]] <= rank[t, k] else 1]
+        total = base_margin
+        for t in range(n_trees):
+            total += value[t, node[t]]
+        out[i] = total
+    return out
+
+@numba.njit("float64[:, :](float64[:], float64[:])", cache=True, fastmath=True)
+def combine_scores(xgb_proba, anomaly_decision):
+    """Ensemble post-processing in one pass over the batch
+
+    Returns a (3, n) array of risk score (0-10), confidence and normalized
+    anomaly score.
+    """
+    n = xgb_proba.shape[0]
+    out = np.empty((3, n))
+    for i in range(n):
+        p = xgb_proba[i]
+        anomaly = min(max(0.5 - anomaly_decision[i], 0.0), 1.0)
+        out[0, i] = (0.7 * p + 0.3 * anomaly) * 10
+        out[1, i] = 1.0 - abs(p - anomaly)
+        out[2, i] = anomaly
+    return out
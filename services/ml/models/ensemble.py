@@ -11,22 +11,80 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, roc_auc_score
 import xgboost as xgb
 import joblib
+import os
 from datetime import datetime, timedelta
 import structlog
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 import asyncio
 
+try:
+    import tl2cgen
+    import treelite
+except ImportError:  # Optional: without them the classifier scores through another backend
+    tl2cgen = treelite = None
+
+try:
+    import onnxruntime
+except ImportError:  # Optional, like tl2cgen
+    onnxruntime = None
+
+try:
+    import onnx
+    from onnxmltools.convert import convert_xgboost
+    from onnxmltools.convert.common.data_types import FloatTensorType
+except ImportError:  # Needed only to export the ONNX model after training
+    convert_xgboost = None
+
+from ._forest_kernels import combine_scores, gbdt_margins, iforest_path_lengths
+
 logger = structlog.get_logger()
 
+# Shared library the trained booster is compiled into, next to the joblib artifacts
+COMPILED_XGB_LIB = "xgb.so"
+# Native (UBJSON) copy of the classifier, preferred over the pickle when loading
+XGB_NATIVE_MODEL = "xgb_model.ubj"
+# Flattened IsolationForest arrays, each saved as models/iforest_<name>.npy
+FLAT_FOREST_ARRAYS = ("feature", "threshold", "children", "leaf_depth")
+# ONNX export of the classifier, scored with onnxruntime when tl2cgen isn't available
+XGB_ONNX_MODEL = "xgb.onnx"
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Average unsuccessful-search path length in a BST of n samples (as in sklearn's IsolationForest)"""
+    n = np.asarray(n_samples, dtype=np.float64)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return out
+
+def _save_array(path: Path, array: np.ndarray):
+    """np.save via a temporary file and rename
+
+    Other workers may have the previous file memory-mapped; truncating it in
+    place would fault their reads, while a rename leaves their mapping intact.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
 class EnsembleRiskModel:
     """Ensemble model combining XGBoost classifier and Isolation Forest for anomaly detection"""
     
     def __init__(self):
         self.xgb_model = None
-        self.isolation_forest = None
+        self._tl_predictor = None  # Compiled booster, when treelite/tl2cgen are installed
+        self._ort_session = None  # onnxruntime session, when installed
+        self.isolation_forest = None  # None when scoring from memory-mapped flat arrays
+        # (feature, threshold, children, leaf_depth, offset, denominator) for iforest_path_lengths
+        self._if_tables = None
+        # (cuts, feature, rank, children, value, depth, base_margin) for gbdt_margins
+        self._xgb_tables = None
         self.scaler = StandardScaler()
-        self.feature_names = []
+        self._scaler_stats = None  # (mean, 1 / scale) as float32
+        self._column_map_cache = None
+        self.feature_names = ()
         self.version = "1.0.0"
         self.is_trained = False
         self.metrics = {}
@@ -51,17 +109,24 @@ class EnsembleRiskModel:
             model_dir = Path("models")
             
             if (model_dir / "xgb_model.joblib").exists():
-                self.xgb_model = joblib.load(model_dir / "xgb_model.joblib")
-                self.isolation_forest = joblib.load(model_dir / "isolation_forest.joblib")
+                self.xgb_model = self._load_xgb(model_dir)
+                # The flattened forest is memory-mapped: read-only pages shared
+                # through the page cache by every worker process, and no tree
+                # objects to unpickle. Older model directories only have the pickle.
+                if not self._load_flat_forest(model_dir):
+                    self.isolation_forest = joblib.load(model_dir / "isolation_forest.joblib", mmap_mode="r")
                 self.scaler = joblib.load(model_dir / "scaler.joblib")
                 
                 # Load metadata
                 metadata = joblib.load(model_dir / "metadata.joblib")
-                self.feature_names = metadata["feature_names"]
+                self.feature_names = tuple(metadata["feature_names"])
                 self.version = metadata["version"]
                 self.metrics = metadata["metrics"]
                 self.last_updated = metadata["last_updated"]
                 
+                self._prepare_inference()
+                self._load_compiled_xgb(model_dir)
+                self._load_onnx(model_dir)
                 self.is_trained = True
                 return True
                 
@@ -70,6 +135,26 @@ class EnsembleRiskModel:
             
         return False
         
+    def _load_flat_forest(self, model_dir: Path) -> bool:
+        """Memory-map the flattened IsolationForest saved with the models, if present"""
+        paths = [model_dir / f"iforest_{name}.npy" for name in FLAT_FOREST_ARRAYS]
+        params = model_dir / "iforest_params.npy"
+        if not params.exists() or not all(path.exists() for path in paths):
+            return False
+        arrays = tuple(np.load(path, mmap_mode="r") for path in paths)
+        self._if_tables = arrays + tuple(np.load(params).tolist())
+        self.isolation_forest = None
+        return True
+    
+    def _load_xgb(self, model_dir: Path) -> xgb.XGBClassifier:
+        """Load the classifier from its native model file, else from the pickle"""
+        native = model_dir / XGB_NATIVE_MODEL
+        if native.exists():
+            model = xgb.XGBClassifier()
+            model.load_model(native)
+            return model
+        return joblib.load(model_dir / "xgb_model.joblib")
+    
     def _save_models(self):
         """Save models to disk"""
         try:
@@ -77,7 +162,13 @@ class EnsembleRiskModel:
             model_dir.mkdir(exist_ok=True)
             
             joblib.dump(self.xgb_model, model_dir / "xgb_model.joblib")
+            # XGBoost's own binary format loads much faster than unpickling
+            self.xgb_model.save_model(model_dir / XGB_NATIVE_MODEL)
             joblib.dump(self.isolation_forest, model_dir / "isolation_forest.joblib")
+            *arrays, offset, denominator = self._if_tables
+            for name, array in zip(FLAT_FOREST_ARRAYS, arrays):
+                _save_array(model_dir / f"iforest_{name}.npy", array)
+            _save_array(model_dir / "iforest_params.npy", np.array([offset, denominator]))
             joblib.dump(self.scaler, model_dir / "scaler.joblib")
             
             # Save metadata
@@ -93,6 +184,84 @@ class EnsembleRiskModel:
             
         except Exception as e:
             logger.error("Failed to save models", error=str(e))
+            return
+        
+        self._compile_xgb(model_dir)
+        self._export_onnx(model_dir)
+        self._load_onnx(model_dir)
+    
+    def _compile_xgb(self, model_dir: Path):
+        """Compile the trained booster into a shared library and load it"""
+        self._tl_predictor = None
+        if tl2cgen is None:
+            return
+        libpath = model_dir / COMPILED_XGB_LIB
+        try:
+            # Unlink rather than overwrite: a previous build may still be mapped
+            libpath.unlink(missing_ok=True)
+            model = treelite.frontend.from_xgboost(self.xgb_model.get_booster())
+            tl2cgen.export_lib(
+                model, toolchain="gcc", libpath=str(libpath),
+                params={"parallel_comp": 4, "quantize": 1}
+            )
+            self._tl_predictor = tl2cgen.Predictor(str(libpath))
+            logger.info("Compiled XGBoost predictor", path=str(libpath))
+        except Exception as e:
+            logger.warning("Failed to compile XGBoost predictor", error=str(e))
+    
+    def _load_compiled_xgb(self, model_dir: Path):
+        """Load the compiled booster saved with the models, if there is one"""
+        self._tl_predictor = None
+        libpath = model_dir / COMPILED_XGB_LIB
+        if tl2cgen is None or not libpath.exists():
+            return
+        try:
+            self._tl_predictor = tl2cgen.Predictor(str(libpath))
+        except Exception as e:
+            logger.warning("Failed to load compiled XGBoost predictor", error=str(e))
+    
+    def _export_onnx(self, model_dir: Path):
+        """Convert the trained classifier to ONNX"""
+        if convert_xgboost is None:
+            return
+        try:
+            onnx_model = convert_xgboost(
+                self.xgb_model, initial_types=[("X", FloatTensorType([None, len(self.feature_names)]))]
+            )
+            onnx.save(onnx_model, str(model_dir / XGB_ONNX_MODEL))
+        except Exception as e:
+            logger.warning("Failed to export XGBoost model to ONNX", error=str(e))
+    
+    def _load_onnx(self, model_dir: Path):
+        """Open an onnxruntime session on the exported classifier, if there is one"""
+        self._ort_session = None
+        path = model_dir / XGB_ONNX_MODEL
+        if onnxruntime is None or not path.exists():
+            return
+        try:
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            # Batches are already coalesced; one thread per batch, as for XGBoost
+            options.intra_op_num_threads = 1
+            self._ort_session = onnxruntime.InferenceSession(
+                str(path), sess_options=options, providers=["CPUExecutionProvider"]
+            )
+        except Exception as e:
+            logger.warning("Failed to load ONNX model", error=str(e))
+    
+    def _xgb_probability(self, feature_array: np.ndarray) -> np.ndarray:
+        """Positive-class probability per scaled row
+
+        Uses the tl2cgen-compiled booster when loaded, then onnxruntime, else
+        the numba kernel over the flattened trees.
+        """
+        if self._tl_predictor is not None:
+            dmat = tl2cgen.DMatrix(feature_array, dtype="float32")
+            return self._tl_predictor.predict(dmat).reshape(-1)
+        if self._ort_session is not None:
+            # Outputs are (labels, probabilities)
+            return self._ort_session.run(None, {"X": feature_array})[1][:, 1]
+        return 1.0 / (1.0 + np.exp(-self._xgb_margins(feature_array)))
     
     async def _train_new_models(self):
         """Train new models with synthetic data"""
@@ -144,6 +313,7 @@ class EnsembleRiskModel:
             }
         }
         
+        self._prepare_inference()
         self.is_trained = True
         self.last_updated = datetime.utcnow()
         
@@ -152,116 +322,290 @@ class EnsembleRiskModel:
         
         logger.info("Model training completed", metrics=self.metrics)
     
+    def _prepare_inference(self):
+        """Set up the fitted models for scoring
+
+        Requests are already coalesced into batches, so XGBoost scores on one
+        thread per batch instead of paying thread fan-out on every call. The
+        scaler's statistics are kept as float32 so scaling happens in place on
+        the float32 feature buffer instead of through StandardScaler.transform,
+        which allocates a float64 copy.
+        """
+        self.xgb_model.set_params(n_jobs=1)
+        # One tuple so a batch scored during retrain never mixes two scalers
+        self._scaler_stats = (
+            self.scaler.mean_.astype(np.float32),
+            (1.0 / self.scaler.scale_).astype(np.float32),
+        )
+        self._column_map_cache = None
+        if self.isolation_forest is not None:
+            self._flatten_isolation_forest()
+        self._flatten_xgb()
+        self._feature_importance = dict(zip(self.feature_names, self.xgb_model.feature_importances_.tolist()))
+        self._metrics_payload = self._build_metrics_payload()
+    
+    def _build_metrics_payload(self) -> Dict[str, Any]:
+        """The static part of get_metrics' entry; counters are added per call"""
+        xgb_metrics = self.metrics.get("xgboost", {})
+        precision = xgb_metrics.get("precision", 0.0)
+        recall = xgb_metrics.get("recall", 0.0)
+        return {
+            "name": "XGBoost Classifier",
+            "version": self.version,
+            "accuracy": xgb_metrics.get("accuracy", 0.0),
+            "precision": precision,
+            "recall": recall,
+            "f1_score": 2 * (precision * recall) / max(precision + recall, 0.001)
+        }
+    
+    def _flatten_xgb(self):
+        """Stack the booster's trees into compact (trees, nodes) arrays for gbdt_margins"""
+        booster = self.xgb_model.get_booster()
+        df = booster.trees_to_dataframe()
+        n_trees = int(df["Tree"].max()) + 1
+        max_nodes = int(df["Node"].max()) + 1
+        feature = np.zeros((n_trees, max_nodes), dtype=np.int32)
+        threshold = np.zeros((n_trees, max_nodes), dtype=np.float32)
+        children = np.zeros((n_trees, max_nodes, 2), dtype=np.int32)
+        value = np.zeros((n_trees, max_nodes), dtype=np.float32)
+        
+        tree = df["Tree"].to_numpy()
+        node = df["Node"].to_numpy()
+        is_leaf = (df["Feature"] == "Leaf").to_numpy()
+        split = ~is_leaf
+        # Leaves loop back to themselves; split nodes point at their Yes/No children
+        children[tree, node, 0] = node
+        children[tree, node, 1] = node
+        children[tree[split], node[split], 0] = df["Yes"][split].str.split("-").str[1].astype(int)
+        children[tree[split], node[split], 1] = df["No"][split].str.split("-").str[1].astype(int)
+        # Trained on plain arrays, so features are named f0, f1, ...
+        feature[tree[split], node[split]] = df["Feature"][split].str[1:].astype(int)
+        threshold[tree[split], node[split]] = df["Split"][split]
+        value[tree[is_leaf], node[is_leaf]] = df["Gain"][is_leaf]
+        
+        # Child ids are always greater than their parent's
+        depth = np.zeros((n_trees, max_nodes), dtype=np.int64)
+        split_tree, split_node = tree[split], node[split]
+        for t, k in sorted(zip(split_tree.tolist(), split_node.tolist())):
+            left, right = children[t, k]
+            depth[t, left] = depth[t, right] = depth[t, k] + 1
+        
+        # Thresholds become ranks: with cuts[f] the sorted distinct thresholds
+        # of feature f and bin(x) the number of cuts <= x, x < cuts[f][j]
+        # exactly when bin(x) <= j. Splits then compare small integers with
+        # no loss, and the node arrays shrink to int8/int16/uint16.
+        is_split = np.zeros((n_trees, max_nodes), dtype=bool)
+        is_split[tree[split], node[split]] = True
+        rank = np.zeros((n_trees, max_nodes), dtype=np.uint16)
+        all_cuts = []
+        for f in range(len(self.feature_names)):
+            used = is_split & (feature == f)
+            cuts = np.unique(threshold[used])
+            rank[used] = np.searchsorted(cuts, threshold[used])
+            all_cuts.append(cuts)
+        
+        tables = (
+            tuple(all_cuts), feature.astype(np.int8), rank, children.astype(np.int16),
+            value, int(depth.max()), 0.0
+        )
+        # Recover the base margin from the booster itself rather than its config
+        probe = np.zeros((1, len(self.feature_names)), dtype=np.float32)
+        base_margin = float(
+            booster.predict(xgb.DMatrix(probe), output_margin=True)[0] - self._xgb_margins(probe, tables)[0]
+        )
+        # Published in one assignment: a retrain can run this while executor
+        # threads are scoring with the previous tables
+        self._xgb_tables = tables[:-1] + (base_margin,)
+    
+    def _xgb_margins(self, feature_array: np.ndarray, tables: Optional[tuple] = None) -> np.ndarray:
+        cuts_by_feature, feature, rank, children, value, depth, base_margin = tables or self._xgb_tables
+        bins = np.empty(feature_array.shape, dtype=np.uint16)
+        for f, cuts in enumerate(cuts_by_feature):
+            bins[:, f] = np.searchsorted(cuts, feature_array[:, f], side="right")
+        return gbdt_margins(bins, feature, rank, children, value, depth, base_margin)
+    
+    def _flatten_isolation_forest(self):
+        """Stack every isolation tree into (trees, nodes) arrays for iforest_path_lengths"""
+        forest = self.isolation_forest
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        max_nodes = max(tree.node_count for tree in trees)
+        feature = np.zeros((len(trees), max_nodes), dtype=np.int32)
+        threshold = np.zeros((len(trees), max_nodes), dtype=np.float64)
+        children = np.full((len(trees), max_nodes, 2), -1, dtype=np.int32)
+        leaf_depth = np.zeros((len(trees), max_nodes), dtype=np.float64)
+        
+        for t, (tree, features) in enumerate(zip(trees, forest.estimators_features_)):
+            k = tree.node_count
+            tree_feature = np.maximum(tree.feature, 0)  # Leaves hold -2
+            if len(features) != forest.n_features_in_:
+                # Trees fit on a feature subset index into that subset
+                tree_feature = np.asarray(features)[tree_feature]
+            feature[t, :k] = tree_feature
+            threshold[t, :k] = tree.threshold
+            children[t, :k, 0] = tree.children_left
+            children[t, :k, 1] = tree.children_right
+            # Nodes are numbered depth-first, so a parent always precedes its children
+            depth = np.zeros(k)
+            for node in range(k):
+                if tree.children_left[node] != -1:
+                    depth[tree.children_left[node]] = depth[tree.children_right[node]] = depth[node] + 1
+            leaf_depth[t, :k] = depth + _average_path_length(tree.n_node_samples)
+        
+        denominator = len(trees) * float(_average_path_length([forest.max_samples_])[0])
+        # Published in one assignment: a retrain can run this while executor
+        # threads are scoring, and mixing arrays of two forests would read out of bounds
+        self._if_tables = (feature, threshold, children, leaf_depth, float(forest.offset_), denominator)
+    
+    def _isolation_decision(self, feature_array: np.ndarray) -> np.ndarray:
+        """IsolationForest.decision_function on scaled float32 rows, from the flattened trees"""
+        feature, threshold, children, leaf_depth, offset, denominator = self._if_tables
+        path_lengths = iforest_path_lengths(feature_array, feature, threshold, children, leaf_depth)
+        return -np.exp2(-path_lengths / denominator) - offset
+    
     def _generate_training_data(self, n_samples: int = 10000) -> tuple:
-        """Generate synthetic training data for AML scenarios"""
+        """Generate synthetic training data for AML scenarios
+
+        Labels are shuffled first and each feature column is drawn straight into
+        the rows of its class, so no per-class arrays are stacked and no
+        shuffled copy of X is made.
+        """
         
-        np.random.seed(42)
+        rng = np.random.Generator(np.random.Philox(42))
         
         # Feature names
-        self.feature_names = [
+        self.feature_names = (
             "amount_zscore", "velocity_1h", "velocity_24h", "geographic_risk",
             "time_anomaly", "amount_structuring", "account_age_days",
             "avg_transaction_amount", "transaction_frequency", "risk_country"
-        ]
+        )
         
-        # Generate normal transactions (80%)
+        # 80% normal, 20% suspicious, in random order
         n_normal = int(n_samples * 0.8)
-        normal_data = np.random.normal(0, 1, (n_normal, len(self.feature_names)))
-        
-        # Adjust normal patterns
-        normal_data[:, 0] = np.random.normal(0, 0.5, n_normal)  # amount_zscore
-        normal_data[:, 1] = np.random.exponential(1, n_normal)  # velocity_1h
-        normal_data[:, 2] = np.random.exponential(2, n_normal)  # velocity_24h
-        normal_data[:, 3] = np.random.beta(2, 8, n_normal)      # geographic_risk
-        normal_data[:, 4] = np.random.beta(2, 8, n_normal)      # time_anomaly
-        normal_data[:, 5] = np.random.beta(1, 10, n_normal)     # amount_structuring
-        normal_data[:, 6] = np.random.lognormal(4, 1, n_normal) # account_age_days
-        normal_data[:, 7] = np.random.lognormal(6, 1, n_normal) # avg_transaction_amount
-        normal_data[:, 8] = np.random.poisson(5, n_normal)      # transaction_frequency
-        normal_data[:, 9] = np.random.beta(1, 9, n_normal)      # risk_country
-        
-        normal_labels = np.zeros(n_normal)
-        
-        # Generate suspicious transactions (20%)
         n_suspicious = n_samples - n_normal
-        suspicious_data = np.random.normal(0, 1, (n_suspicious, len(self.feature_names)))
-        
-        # Create suspicious patterns
-        suspicious_data[:, 0] = np.random.normal(2, 1, n_suspicious)    # High amount_zscore
-        suspicious_data[:, 1] = np.random.exponential(5, n_suspicious)  # High velocity_1h
-        suspicious_data[:, 2] = np.random.exponential(10, n_suspicious) # High velocity_24h
-        suspicious_data[:, 3] = np.random.beta(8, 2, n_suspicious)      # High geographic_risk
-        suspicious_data[:, 4] = np.random.beta(6, 4, n_suspicious)      # Higher time_anomaly
-        suspicious_data[:, 5] = np.random.beta(7, 3, n_suspicious)      # Higher structuring risk
-        suspicious_data[:, 6] = np.random.lognormal(3, 1, n_suspicious) # Newer accounts
-        suspicious_data[:, 7] = np.random.lognormal(8, 1, n_suspicious) # Higher avg amounts
-        suspicious_data[:, 8] = np.random.poisson(15, n_suspicious)     # Higher frequency
-        suspicious_data[:, 9] = np.random.beta(6, 4, n_suspicious)      # Higher risk countries
-        
-        suspicious_labels = np.ones(n_suspicious)
-        
-        # Combine data
-        X = np.vstack([normal_data, suspicious_data])
-        y = np.hstack([normal_labels, suspicious_labels])
-        
-        # Shuffle
-        indices = np.random.permutation(len(X))
-        X = X[indices]
-        y = y[indices]
+        y = np.zeros(n_samples, dtype=np.int8)
+        y[n_normal:] = 1
+        rng.shuffle(y)
+        normal = y == 0
+        suspicious = ~normal
+        
+        # Column-major, so each feature column is one contiguous run
+        X = np.empty((n_samples, len(self.feature_names)), dtype=np.float32, order="F")
+        
+        # Normal patterns
+        X[normal, 0] = rng.normal(0, 0.5, n_normal)   # amount_zscore
+        X[normal, 1] = rng.exponential(1, n_normal)   # velocity_1h
+        X[normal, 2] = rng.exponential(2, n_normal)   # velocity_24h
+        X[normal, 3] = rng.beta(2, 8, n_normal)       # geographic_risk
+        X[normal, 4] = rng.beta(2, 8, n_normal)       # time_anomaly
+        X[normal, 5] = rng.beta(1, 10, n_normal)      # amount_structuring
+        X[normal, 6] = rng.lognormal(4, 1, n_normal)  # account_age_days
+        X[normal, 7] = rng.lognormal(6, 1, n_normal)  # avg_transaction_amount
+        X[normal, 8] = rng.poisson(5, n_normal)       # transaction_frequency
+        X[normal, 9] = rng.beta(1, 9, n_normal)       # risk_country
+        
+        # Suspicious patterns
+        X[suspicious, 0] = rng.normal(2, 1, n_suspicious)    # High amount_zscore
+        X[suspicious, 1] = rng.exponential(5, n_suspicious)  # High velocity_1h
+        X[suspicious, 2] = rng.exponential(10, n_suspicious) # High velocity_24h
+        X[suspicious, 3] = rng.beta(8, 2, n_suspicious)      # High geographic_risk
+        X[suspicious, 4] = rng.beta(6, 4, n_suspicious)      # Higher time_anomaly
+        X[suspicious, 5] = rng.beta(7, 3, n_suspicious)      # Higher structuring risk
+        X[suspicious, 6] = rng.lognormal(3, 1, n_suspicious) # Newer accounts
+        X[suspicious, 7] = rng.lognormal(8, 1, n_suspicious) # Higher avg amounts
+        X[suspicious, 8] = rng.poisson(15, n_suspicious)     # Higher frequency
+        X[suspicious, 9] = rng.beta(6, 4, n_suspicious)      # Higher risk countries
         
         return X, y
     
-    async def predict(self, features: Dict[str, float]) -> Dict[str, Any]:
-        """Predict risk score for a transaction"""
+    async def predict(self, features: np.ndarray, feature_index: Dict[str, int]) -> Dict[str, Any]:
+        """Predict risk score for one engineered feature vector"""
+        
+        predictions = await self.predict_batch(features.reshape(1, -1), feature_index)
+        return predictions[0]
+    
+    async def predict_batch(self, feature_matrix: np.ndarray, feature_index: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Predict risk scores for a batch of engineered feature rows
+
+        Scoring runs in the default executor so a large batch doesn't stall
+        /predict, /health or the prediction coalescer on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.predict_matrix, feature_matrix, feature_index)
+    
+    def predict_matrix(self, feature_matrix: np.ndarray, feature_index: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Synchronous batch scoring, safe to run in an executor thread
+
+        feature_index maps feature names to columns of feature_matrix; model
+        features the engineer doesn't produce are zero-filled.
+        """
         
         if not self.is_trained:
             raise ValueError("Model is not trained")
         
-        # Convert features to array
-        feature_array = np.array([features.get(name, 0.0) for name in self.feature_names]).reshape(1, -1)
-        
-        # Scale features
-        feature_array_scaled = self.scaler.transform(feature_array)
-        
-        # Get XGBoost prediction
-        xgb_proba = self.xgb_model.predict_proba(feature_array_scaled)[0, 1]
-        
-        # Get anomaly score from Isolation Forest
-        anomaly_score = self.isolation_forest.decision_function(feature_array_scaled)[0]
-        # Convert to 0-1 scale (higher = more anomalous)
-        anomaly_score_normalized = max(0, min(1, (0.5 - anomaly_score) / 1.0))
-        
-        # Ensemble prediction (weighted average)
-        ensemble_score = (0.7 * xgb_proba) + (0.3 * anomaly_score_normalized)
+        # Gather the model's columns in training order with one fancy-indexed copy
+        model_columns, source_columns = self._column_map(feature_index)
+        feature_array = np.zeros((feature_matrix.shape[0], len(self.feature_names)), dtype=np.float32)
+        feature_array[:, model_columns] = feature_matrix[:, source_columns]
+        return self._score(feature_array)
+    
+    def predict_from_array(self, feature_array: np.ndarray) -> List[Dict[str, Any]]:
+        """Score rows whose columns are already in feature_names order, skipping the name lookup"""
         
-        # Convert to 0-10 risk score
-        risk_score = ensemble_score * 10
+        if not self.is_trained:
+            raise ValueError("Model is not trained")
+        # Copied: scoring scales the buffer in place
+        return self._score(np.array(feature_array, dtype=np.float32, order="C", ndmin=2))
+    
+    def _column_map(self, feature_index: Dict[str, int]) -> tuple:
+        """(model columns, feature_index columns) for the names both share, cached per mapping"""
+        cached = self._column_map_cache
+        if cached is not None and cached[0] is feature_index:
+            return cached[1]
+        pairs = [(i, feature_index[name]) for i, name in enumerate(self.feature_names) if name in feature_index]
+        columns = (
+            np.array([i for i, _ in pairs], dtype=np.intp),
+            np.array([j for _, j in pairs], dtype=np.intp),
+        )
+        self._column_map_cache = (feature_index, columns)
+        return columns
+    
+    def _score(self, feature_array: np.ndarray) -> List[Dict[str, Any]]:
+        """Scale a fresh float32 (n, features) buffer in place and run both models"""
+        n = feature_array.shape[0]
         
-        # Get feature importance
-        feature_importance = dict(zip(
-            self.feature_names,
-            self.xgb_model.feature_importances_
-        ))
+        # StandardScaler.transform, in place and in float32
+        mean, inv_scale = self._scaler_stats
+        np.subtract(feature_array, mean, out=feature_array)
+        np.multiply(feature_array, inv_scale, out=feature_array)
+        xgb_proba = self._xgb_probability(feature_array).astype(np.float64, copy=False)
+        anomaly_score = self._isolation_decision(feature_array)
         
-        # Calculate confidence based on consistency between models
-        confidence = 1.0 - abs(xgb_proba - anomaly_score_normalized)
+        # One fused pass; tolist() turns every score into a Python float at once
+        risk_scores, confidences, anomaly_scores = combine_scores(xgb_proba, anomaly_score).tolist()
         
-        self.prediction_count += 1
+        self.prediction_count += n
         
-        return {
-            "risk_score": float(risk_score),
-            "confidence": float(confidence),
-            "feature_importance": feature_importance,
-            "xgb_probability": float(xgb_proba),
-            "anomaly_score": float(anomaly_score_normalized)
-        }
+        # Global importances, shared by every row
+        feature_importance = self._feature_importance
+        return [
+            {
+                "risk_score": risk_score,
+                "confidence": confidence,
+                "feature_importance": feature_importance,
+                "xgb_probability": probability,
+                "anomaly_score": anomaly
+            }
+            for risk_score, confidence, probability, anomaly
+            in zip(risk_scores, confidences, xgb_proba.tolist(), anomaly_scores)
+        ]
     
     async def get_feature_importance(self) -> Dict[str, float]:
         """Get global feature importance"""
         if not self.is_trained:
             return {}
         
-        return dict(zip(self.feature_names, self.xgb_model.feature_importances_))
+        # Plain floats: numpy scalars aren't JSON-serializable without a response_model
+        return dict(self._feature_importance)
     
     async def get_metrics(self) -> List[Dict[str, Any]]:
         """Get model performance metrics"""
@@ -270,15 +614,7 @@ class EnsembleRiskModel:
         
         return [
             {
-                "name": "XGBoost Classifier",
-                "version": self.version,
-                "accuracy": self.metrics.get("xgboost", {}).get("accuracy", 0.0),
-                "precision": self.metrics.get("xgboost", {}).get("precision", 0.0),
-                "recall": self.metrics.get("xgboost", {}).get("recall", 0.0),
-                "f1_score": 2 * (self.metrics.get("xgboost", {}).get("precision", 0.0) * 
-                               self.metrics.get("xgboost", {}).get("recall", 0.0)) / 
-                          max((self.metrics.get("xgboost", {}).get("precision", 0.0) + 
-                               self.metrics.get("xgboost", {}).get("recall", 0.0)), 0.001),
+                **self._metrics_payload,
                 "last_trained": self.last_updated or datetime.utcnow(),
                 "total_predictions": self.prediction_count
             }
@@ -292,7 +628,7 @@ class EnsembleRiskModel:
         
     def is_ready(self) -> bool:
         """Check if models are ready for prediction"""
-        return self.is_trained and self.xgb_model is not None and self.isolation_forest is not None
+        return self.is_trained and self.xgb_model is not None and self._if_tables is not None
     
     def get_version(self) -> str:
         """Get model version"""
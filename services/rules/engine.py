@@ -5,20 +5,320 @@ YAML-based rule configuration system for detecting suspicious patterns
 
 import yaml
 import structlog
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 from pathlib import Path
 from datetime import datetime, timedelta
+import math
 import re
 import asyncio
 
+import numpy as np
+
+try:
+    import re2  # google-re2: linear-time matching, no catastrophic backtracking
+except ImportError:
+    re2 = None
+
 logger = structlog.get_logger()
 
+# Operators that compare a number, evaluated over whole float columns in batches
+_NUMERIC_OPERATORS = {"greater_than", "less_than", "greater_equal", "less_equal", "between", "near_threshold"}
+_OPERATORS = _NUMERIC_OPERATORS | {"equals", "not_equals", "in", "not_in", "contains", "not_contains", "regex"}
+
+# Relative evaluation cost, for ordering AND conditions; unlisted operators cost 1
+_OPERATOR_COST = {"contains": 2.0, "not_contains": 2.0, "regex": 4.0}
+
+# AND rules re-sort their conditions by observed pass rate this often
+CONDITION_REORDER_INTERVAL = 1024
+
+# Batches at least this large are evaluated in the default executor, off the event loop
+EXECUTOR_BATCH_MIN = 64
+
+def _get_path(transaction: Any, path: tuple) -> Any:
+    """Field value by pre-split dot path (e.g. ('location', 'country'))
+
+    Works on dicts and on attribute-style records such as the stream's
+    TransactionRecord; a missing field at any level gives None.
+    """
+    value = transaction
+    for part in path:
+        if isinstance(value, dict):
+            value = value.get(part)
+        else:
+            value = getattr(value, part, None)
+        if value is None:
+            return None
+    return value
+
+def _float_or_nan(value: Any) -> float:
+    """float(value), with NaN for missing or non-numeric values so every comparison fails"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _compile_regex(pattern: str):
+    """Compile with RE2 when installed; patterns RE2 can't express (e.g. backreferences) use re"""
+    if re2 is not None:
+        try:
+            return re2.compile(pattern)
+        except re2.error:
+            logger.info("Pattern not supported by RE2, using re", pattern=pattern)
+    return re.compile(pattern)
+
+def _membership(expected: Any) -> Callable[[Any], bool]:
+    """Test for the in operator; a frozenset when every value is hashable
+
+    Only list-like values become sets. Anything else, notably a string, keeps
+    the plain `field in value` check, which for a string is a substring test.
+    """
+    if not isinstance(expected, (list, tuple, set, frozenset)):
+        return lambda v: v in expected
+    try:
+        members = frozenset(expected)
+    except TypeError:
+        members = expected
+    def test(v):
+        try:
+            return v in members
+        except TypeError:
+            # Unhashable field values fall back to the list scan
+            return v in expected
+    return test
+
+def _scalar_test(operator: str, expected: Any) -> Optional[Callable[[Any], bool]]:
+    """Predicate on one non-None field value, with the expected value prepared once"""
+    if operator == "equals":
+        return lambda v: v == expected
+    if operator == "not_equals":
+        return lambda v: v != expected
+    if operator == "in":
+        return _membership(expected)
+    if operator == "not_in":
+        member = _membership(expected)
+        return lambda v: not member(v)
+    if operator == "contains":
+        return lambda v: expected in str(v).lower()
+    if operator == "not_contains":
+        return lambda v: expected not in str(v).lower()
+    if operator == "regex":
+        pattern = _compile_regex(expected)
+        return lambda v: pattern.search(str(v)) is not None
+    if operator in _NUMERIC_OPERATORS:
+        column_test = _column_test(operator, expected)
+        if column_test is None:
+            return None
+        return lambda v: bool(column_test(float(v)))
+    return None
+
+def _column_test(operator: str, expected: Any) -> Optional[Callable[[Any], Any]]:
+    """Numeric predicate that works on a float or elementwise on a float array"""
+    if operator == "between":
+        if not (isinstance(expected, list) and len(expected) == 2):
+            return None
+        low, high = float(expected[0]), float(expected[1])
+        return lambda a: (low <= a) & (a <= high)
+    if operator == "near_threshold":
+        # Special operator for detecting amounts near reporting thresholds
+        threshold = float(expected)
+        low = threshold * 0.85
+        return lambda a: (low <= a) & (a < threshold)
+    bound = float(expected)
+    if operator == "greater_than":
+        return lambda a: a > bound
+    if operator == "less_than":
+        return lambda a: a < bound
+    if operator == "greater_equal":
+        return lambda a: a >= bound
+    return lambda a: a <= bound
+
+class _CompiledCondition:
+    """One rule condition with its field path and operator resolved at load time"""
+    
+    __slots__ = ("path", "test", "column_test", "members", "negate", "bitmap", "cost", "evaluations", "passes")
+    
+    def __init__(self, condition: Dict[str, Any]):
+        field = condition.get("field")
+        operator = condition.get("operator")
+        self.path = tuple(field.split(".")) if field else ()
+        self.test = None
+        self.column_test = None
+        # in/not_in over strings (country codes and the like): batches test a
+        # boolean bitmap indexed by shared integer codes, see bind_codes
+        value = condition.get("value")
+        is_string_set = (
+            operator in ("in", "not_in") and isinstance(value, list) and all(isinstance(v, str) for v in value)
+        )
+        self.members = tuple(value) if is_string_set else ()
+        self.negate = operator == "not_in"
+        self.bitmap = None
+        self.cost = _OPERATOR_COST.get(operator, 1.0)
+        # Observed outcomes, counted only where the order of evaluation matters (AND rules)
+        self.evaluations = 0
+        self.passes = 0
+        if not field or not operator:
+            return
+        try:
+            self.test = _scalar_test(operator, condition.get("value"))
+            if operator in _NUMERIC_OPERATORS:
+                self.column_test = _column_test(operator, condition.get("value"))
+        except (ValueError, TypeError, re.error) as e:
+            logger.warning("Invalid rule condition", field=field, operator=operator, error=str(e))
+            self.test = self.column_test = None
+            return
+        if operator not in _OPERATORS:
+            logger.warning("Unknown operator", operator=operator)
+    
+    def bind_codes(self, codes: Dict[str, int]):
+        """Build the membership bitmap over codes
+
+        Two trailing slots follow the codes: values not in the table, and
+        missing values (which fail every condition, as in evaluate).
+        """
+        if not self.members or self.test is None:
+            return
+        bitmap = np.zeros(len(codes) + 2, dtype=bool)
+        bitmap[[codes[v] for v in self.members]] = True
+        if self.negate:
+            bitmap = ~bitmap
+        bitmap[-1] = False
+        self.bitmap = bitmap
+    
+    def expected_cost(self) -> float:
+        """Cost per rejection: cheap conditions that usually fail go first"""
+        pass_rate = (self.passes + 1) / (self.evaluations + 2)
+        return self.cost / (1.0 - pass_rate)
+    
+    def evaluate(self, transaction: Dict[str, Any]) -> bool:
+        if self.test is None:
+            return False
+        value = _get_path(transaction, self.path)
+        if value is None:
+            return False
+        try:
+            return bool(self.test(value))
+        except (ValueError, TypeError, AttributeError):
+            return False
+    
+    def evaluate_batch(self, transactions: List[Dict[str, Any]], columns: "_CategoryColumns") -> np.ndarray:
+        """Boolean mask over the batch"""
+        n = len(transactions)
+        if self.test is None:
+            return np.zeros(n, dtype=bool)
+        if self.bitmap is not None:
+            return self.bitmap[columns.codes(self.path)]
+        if self.column_test is not None:
+            path = self.path
+            column = np.fromiter(
+                (_float_or_nan(_get_path(t, path)) for t in transactions), dtype=np.float64, count=n
+            )
+            return self.column_test(column)
+        return np.fromiter((self.evaluate(t) for t in transactions), dtype=bool, count=n)
+
+class _CompiledRule:
+    """A rule's conditions, logic and base score, ready for evaluation"""
+    
+    __slots__ = ("conditions", "require_all", "base_score", "evaluations")
+    
+    def __init__(self, rule_config: Dict[str, Any]):
+        self.conditions = [_CompiledCondition(c) for c in rule_config.get("conditions", [])]
+        # AND or OR; anything else defaults to AND
+        self.require_all = rule_config.get("logic", "AND") != "OR"
+        self.base_score = rule_config.get("score", 0.5)
+        self.evaluations = 0
+        if self.require_all:
+            self.conditions.sort(key=_CompiledCondition.expected_cost)
+    
+    def bind_codes(self, codes: Dict[str, int]):
+        for condition in self.conditions:
+            condition.bind_codes(codes)
+    
+    def evaluate(self, transaction: Dict[str, Any]) -> tuple[bool, float]:
+        if not self.conditions:
+            return False, 0.0
+        if self.require_all:
+            return self._evaluate_all(transaction)
+        # OR rules score by the share of conditions met, so every condition runs
+        met = sum(c.evaluate(transaction) for c in self.conditions)
+        return met > 0, self.base_score * met / len(self.conditions) if met else 0.0
+    
+    def _evaluate_all(self, transaction: Dict[str, Any]) -> tuple[bool, float]:
+        """AND logic: stop at the first failed condition; all met scores the full base score"""
+        self.evaluations += 1
+        if self.evaluations % CONDITION_REORDER_INTERVAL == 0:
+            # A new list rather than sort(): batch evaluation may be iterating this one
+            self.conditions = sorted(self.conditions, key=_CompiledCondition.expected_cost)
+        for condition in self.conditions:
+            condition.evaluations += 1
+            if not condition.evaluate(transaction):
+                return False, 0.0
+            condition.passes += 1
+        return True, self.base_score
+    
+    def evaluate_batch(self, transactions: List[Dict[str, Any]], columns: "_CategoryColumns") -> tuple[np.ndarray, np.ndarray]:
+        """Triggered mask and scores over the batch"""
+        n = len(transactions)
+        if not self.conditions:
+            return np.zeros(n, dtype=bool), np.zeros(n)
+        masks = np.stack([c.evaluate_batch(transactions, columns) for c in self.conditions])
+        met = masks.sum(axis=0)
+        is_triggered = masks.all(axis=0) if self.require_all else masks.any(axis=0)
+        scores = np.where(is_triggered, self.base_score * met / len(self.conditions), 0.0)
+        return is_triggered, scores
+
+class _CategoryColumns:
+    """Per-batch cache of categorical fields encoded as integer codes
+
+    Several conditions usually test the same field (e.g. location.country),
+    so each field is looked up and encoded once per batch.
+    """
+    
+    __slots__ = ("transactions", "table", "cache")
+    
+    def __init__(self, transactions: List[Dict[str, Any]], table: Dict[str, int]):
+        self.transactions = transactions
+        self.table = table
+        self.cache: Dict[tuple, np.ndarray] = {}
+    
+    def codes(self, path: tuple) -> np.ndarray:
+        codes = self.cache.get(path)
+        if codes is None:
+            table = self.table
+            unknown, missing = len(table), len(table) + 1
+            def encode(value):
+                if value is None:
+                    return missing
+                try:
+                    return table.get(value, unknown)
+                except TypeError:  # Unhashable values are never members
+                    return unknown
+            codes = np.fromiter(
+                (encode(_get_path(t, path)) for t in self.transactions),
+                dtype=np.intp, count=len(self.transactions)
+            )
+            self.cache[path] = codes
+        return codes
+
+def _evaluate_rules_batch(rules: List[tuple], transactions: List[Dict[str, Any]], codes: Dict[str, int]) -> List[tuple]:
+    """(rule_name, (triggered mask, scores) or the exception raised) for each rule"""
+    columns = _CategoryColumns(transactions, codes)
+    outcomes = []
+    for rule_name, rule in rules:
+        try:
+            outcomes.append((rule_name, rule.evaluate_batch(transactions, columns)))
+        except Exception as e:
+            outcomes.append((rule_name, e))
+    return outcomes
+
 class RulesEngine:
     """YAML-based AML rules engine"""
     
     def __init__(self, rules_dir: str = "services/rules/configs"):
         self.rules_dir = Path(rules_dir)
         self.rules = {}
+        self._compiled_rules: Dict[str, _CompiledRule] = {}
+        # Integer code per string in any in/not_in list, shared by all rules
+        self._category_codes: Dict[str, int] = {}
         self.rule_stats = {}
         
     async def load_rules(self):
@@ -37,6 +337,7 @@ class RulesEngine:
                 
                 rule_name = rule_file.stem
                 self.rules[rule_name] = rule_config
+                self._compiled_rules[rule_name] = _CompiledRule(rule_config)
                 self.rule_stats[rule_name] = {
                     "triggers": 0,
                     "evaluations": 0,
@@ -48,31 +349,43 @@ class RulesEngine:
             except Exception as e:
                 logger.error("Failed to load rule", file=str(rule_file), error=str(e))
         
+        self._bind_category_codes()
         logger.info(f"Loaded {len(self.rules)} rules successfully")
     
+    def _bind_category_codes(self):
+        """Assign codes to every string in in/not_in lists and build each condition's bitmap"""
+        codes: Dict[str, int] = {}
+        for rule in self._compiled_rules.values():
+            for condition in rule.conditions:
+                for value in condition.members:
+                    codes.setdefault(value, len(codes))
+        for rule in self._compiled_rules.values():
+            rule.bind_codes(codes)
+        self._category_codes = codes
+    
     async def evaluate_transaction(self, transaction: Dict[str, Any]) -> Dict[str, Any]:
         """Evaluate transaction against all rules"""
         
         triggered_rules = []
         rule_scores = {}
         
-        for rule_name, rule_config in self.rules.items():
+        for rule_name, rule in self._compiled_rules.items():
             try:
-                self.rule_stats[rule_name]["evaluations"] += 1
+                stats = self.rule_stats[rule_name]
+                stats["evaluations"] += 1
                 
-                # Evaluate rule conditions
-                is_triggered, score = await self._evaluate_rule(rule_config, transaction)
+                is_triggered, score = rule.evaluate(transaction)
                 
                 if is_triggered:
                     triggered_rules.append(rule_name)
                     rule_scores[rule_name] = score
-                    self.rule_stats[rule_name]["triggers"] += 1
-                    self.rule_stats[rule_name]["last_triggered"] = datetime.utcnow()
+                    stats["triggers"] += 1
+                    stats["last_triggered"] = datetime.utcnow()
                     
                     logger.info(
                         "Rule triggered",
                         rule_name=rule_name,
-                        transaction_id=transaction.get("transaction_id"),
+                        transaction_id=_get_path(transaction, ("transaction_id",)),
                         score=score
                     )
                 
@@ -85,128 +398,48 @@ class RulesEngine:
             "evaluation_timestamp": datetime.utcnow().isoformat()
         }
     
-    async def _evaluate_rule(self, rule_config: Dict[str, Any], transaction: Dict[str, Any]) -> tuple[bool, float]:
-        """Evaluate a single rule against transaction"""
-        
-        conditions = rule_config.get("conditions", [])
-        logic = rule_config.get("logic", "AND")  # AND or OR
-        base_score = rule_config.get("score", 0.5)
-        
-        if not conditions:
-            return False, 0.0
-        
-        condition_results = []
-        
-        for condition in conditions:
-            result = await self._evaluate_condition(condition, transaction)
-            condition_results.append(result)
+    async def evaluate_batch(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Evaluate many transactions against all rules
+
+        Each condition produces one boolean mask over the batch (numeric
+        operators compare a whole float column at once) and each rule combines
+        its masks with a single all/any. Results match evaluate_transaction.
+        Evaluation is pure CPU work, so large batches run in the default
+        executor; statistics are updated back on the event loop.
+        """
         
-        # Apply logic operator
-        if logic == "AND":
-            is_triggered = all(condition_results)
-        elif logic == "OR":
-            is_triggered = any(condition_results)
-        else:
-            # Default to AND
-            is_triggered = all(condition_results)
+        n = len(transactions)
+        results = [{"triggered_rules": [], "rule_scores": {}} for _ in range(n)]
+        rules = list(self._compiled_rules.items())
         
-        # Calculate score based on number of conditions met
-        if is_triggered:
-            score_multiplier = sum(condition_results) / len(condition_results)
-            final_score = base_score * score_multiplier
+        if n >= EXECUTOR_BATCH_MIN:
+            outcomes = await asyncio.get_running_loop().run_in_executor(
+                None, _evaluate_rules_batch, rules, transactions, self._category_codes
+            )
         else:
-            final_score = 0.0
-        
-        return is_triggered, final_score
-    
-    async def _evaluate_condition(self, condition: Dict[str, Any], transaction: Dict[str, Any]) -> bool:
-        """Evaluate a single condition"""
-        
-        field = condition.get("field")
-        operator = condition.get("operator")
-        value = condition.get("value")
-        
-        if not field or not operator:
-            return False
-        
-        # Get field value from transaction
-        field_value = self._get_field_value(transaction, field)
+            outcomes = _evaluate_rules_batch(rules, transactions, self._category_codes)
         
-        if field_value is None:
-            return False
-        
-        # Apply operator
-        return self._apply_operator(field_value, operator, value)
-    
-    def _get_field_value(self, transaction: Dict[str, Any], field_path: str) -> Any:
-        """Get field value using dot notation (e.g., 'location.country')"""
-        
-        parts = field_path.split(".")
-        value = transaction
-        
-        for part in parts:
-            if isinstance(value, dict) and part in value:
-                value = value[part]
-            else:
-                return None
-        
-        return value
-    
-    def _apply_operator(self, field_value: Any, operator: str, expected_value: Any) -> bool:
-        """Apply comparison operator"""
-        
-        try:
-            if operator == "equals":
-                return field_value == expected_value
-            
-            elif operator == "not_equals":
-                return field_value != expected_value
-            
-            elif operator == "greater_than":
-                return float(field_value) > float(expected_value)
-            
-            elif operator == "less_than":
-                return float(field_value) < float(expected_value)
-            
-            elif operator == "greater_equal":
-                return float(field_value) >= float(expected_value)
+        for rule_name, outcome in outcomes:
+            if isinstance(outcome, Exception):
+                logger.error("Rule evaluation failed", rule_name=rule_name, error=str(outcome))
+                continue
+            is_triggered, scores = outcome
             
-            elif operator == "less_equal":
-                return float(field_value) <= float(expected_value)
-            
-            elif operator == "in":
-                return field_value in expected_value
-            
-            elif operator == "not_in":
-                return field_value not in expected_value
-            
-            elif operator == "contains":
-                return expected_value in str(field_value).lower()
-            
-            elif operator == "not_contains":
-                return expected_value not in str(field_value).lower()
-            
-            elif operator == "regex":
-                return bool(re.search(expected_value, str(field_value)))
-            
-            elif operator == "between":
-                if isinstance(expected_value, list) and len(expected_value) == 2:
-                    return expected_value[0] <= float(field_value) <= expected_value[1]
-                return False
-            
-            elif operator == "near_threshold":
-                # Special operator for detecting amounts near reporting thresholds
-                threshold = float(expected_value)
-                amount = float(field_value)
-                return (threshold * 0.85) <= amount < threshold
-            
-            else:
-                logger.warning("Unknown operator", operator=operator)
-                return False
-                
-        except (ValueError, TypeError, AttributeError) as e:
-            logger.debug("Operator evaluation failed", operator=operator, error=str(e))
-            return False
+            stats = self.rule_stats[rule_name]
+            stats["evaluations"] += n
+            triggered = np.flatnonzero(is_triggered)
+            if triggered.size:
+                stats["triggers"] += int(triggered.size)
+                stats["last_triggered"] = datetime.utcnow()
+                logger.info("Rule triggered", rule_name=rule_name, transactions=int(triggered.size))
+            for i in triggered.tolist():
+                results[i]["triggered_rules"].append(rule_name)
+                results[i]["rule_scores"][rule_name] = float(scores[i])
+        
+        timestamp = datetime.utcnow().isoformat()
+        for result in results:
+            result["evaluation_timestamp"] = timestamp
+        return results
     
     def get_rule_stats(self) -> Dict[str, Any]:
         """Get rule execution statistics"""
@@ -239,6 +472,7 @@ class RulesEngine:
         
         # Clear existing rules but preserve stats
         self.rules.clear()
+        self._compiled_rules.clear()
         
         # Load rules again
         await self.load_rules()
@@ -0,0 +1,95 @@
+"""
+ML request batching for the stream processor
+Concurrent predictions are sent to the ML service as one /predict_batch call
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import structlog
+
+logger = structlog.get_logger()
+
+class MLPredictionBatcher:
+    """Coalesce concurrent prediction requests into batched calls
+
+    Callers queue one request dict and await its prediction. A background task
+    gathers up to max_batch_size queued requests, waiting at most
+    max_queue_time seconds after the first, and hands them to send_batch.
+    Each batch is sent in its own task, so a slow round-trip doesn't hold up
+    the next batch.
+    """
+    
+    def __init__(
+        self,
+        send_batch: Callable[[List[Any]], Awaitable[List[Optional[Dict[str, Any]]]]],
+        max_batch_size: int = 64,
+        max_queue_time: float = 0.02
+    ):
+        self.send_batch = send_batch
+        self.max_batch_size = max_batch_size
+        self.max_queue_time = max_queue_time
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+    
+    def start(self):
+        """Start the batching task on the running loop"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop batching and wait for batches already sent"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+    
+    async def process(self, request: Any) -> Optional[Dict[str, Any]]:
+        """Queue one request and wait for its prediction"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((request, future))
+        return await future
+    
+    async def _collect(self) -> list:
+        """Wait for one request, then gather more until the batch is full or max_queue_time elapses"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_queue_time
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+    
+    async def _dispatch(self, batch: list):
+        try:
+            results = await self.send_batch([request for request, _ in batch])
+        except Exception as e:
+            logger.error("ML batch request failed", error=str(e), batch_size=len(batch))
+            results = [None] * len(batch)
+        for (_, future), result in zip(batch, results):
+            # Callers that went away leave cancelled futures behind
+            if not future.done():
+                future.set_result(result)
@@ -5,17 +5,96 @@ Consumes transactions from asyncio queue for processing
 
 import asyncio
 import json
+import os
+import time
+from collections import deque
+import msgspec
 import structlog
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
+try:
+    from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+except ImportError:
+    AIOKafkaConsumer = AIOKafkaProducer = None
+
 logger = structlog.get_logger()
 
+# Kafka backing for the stream; unset keeps the in-process queue. Replicas
+# sharing KAFKA_GROUP_ID split the topic's partitions between them
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS")
+KAFKA_TOPIC = os.getenv("KAFKA_TRANSACTIONS_TOPIC", "transactions")
+KAFKA_GROUP_ID = os.getenv("KAFKA_GROUP_ID", "amlguard-stream")
+KAFKA_MAX_POLL_RECORDS = 500
+
+def kafka_enabled() -> bool:
+    """Whether transactions flow through Kafka instead of the in-process queue"""
+    if not KAFKA_BOOTSTRAP_SERVERS:
+        return False
+    if AIOKafkaConsumer is None:
+        logger.warning("KAFKA_BOOTSTRAP_SERVERS is set but aiokafka is not installed, using in-process queue")
+        return False
+    return True
+
+@lru_cache(maxsize=1)
+def _seconds_iso(seconds: int) -> str:
+    """Date and time part of an ISO timestamp, formatted once per second"""
+    return datetime.utcfromtimestamp(seconds).strftime("%Y-%m-%dT%H:%M:%S")
+
+def utc_isoformat(t: Optional[float] = None) -> str:
+    """UTC ISO timestamp for a time.time() value (now by default)
+
+    Only the microsecond tail is formatted per call; unlike
+    datetime.isoformat() the fraction is always present.
+    """
+    if t is None:
+        t = time.time()
+    seconds = int(t)
+    return f"{_seconds_iso(seconds)}.{int((t - seconds) * 1e6):06d}"
+
+class TransactionRecord(msgspec.Struct, gc=False):
+    """Transaction message passed through the queue
+
+    A slotted C struct built once at enqueue: fields are read as attributes
+    instead of hashed dict lookups and each queued message is a fraction of
+    a dict's size. gc=False is safe because records never form cycles.
+    """
+    transaction_id: str
+    customer_id: str
+    amount: float
+    transaction_type: str
+    from_account_id: Optional[str] = None
+    to_account_id: Optional[str] = None
+    currency: str = "USD"
+    description: Optional[str] = None
+    location: Optional[Dict[str, Any]] = None
+    timestamp: Optional[str] = None
+    # Enqueue time for records that arrive without a timestamp; formatted lazily
+    timestamp_ns: Optional[int] = None
+    is_suspicious: bool = False
+    suspicious_pattern: Optional[str] = None
+    
+    @property
+    def iso_timestamp(self) -> Optional[str]:
+        """ISO timestamp for external consumers, formatting timestamp_ns on demand"""
+        if self.timestamp is None and self.timestamp_ns is not None:
+            return utc_isoformat(self.timestamp_ns / 1e9)
+        return self.timestamp
+
+# Decodes raw JSON from the network straight into a record, without an intermediate dict
+transaction_decoder = msgspec.json.Decoder(TransactionRecord)
+transaction_encoder = msgspec.json.Encoder()
+
 class TransactionConsumer:
     """Asyncio-based transaction consumer"""
     
     def __init__(self, queue_size: int = 1000):
-        self.transaction_queue = asyncio.Queue(maxsize=queue_size)
+        # A plain deque plus one Event: put/get are deque operations, and only
+        # a consumer that finds the ring empty waits on the Event
+        self.transaction_queue: deque = deque()
+        self.queue_size = queue_size
+        self._available = asyncio.Event()
         self.running = False
         self.processed_count = 0
         
@@ -24,40 +103,113 @@ class TransactionConsumer:
         logger.info("Starting transaction consumer")
         self.running = True
         
-        # In a real implementation, this would connect to a message broker
-        # For now, we'll simulate receiving transactions
-        await self._simulate_transaction_stream()
+        if kafka_enabled():
+            await self._consume_kafka()
+        else:
+            # Without a broker the producer enqueues directly
+            await self._simulate_transaction_stream()
     
     async def stop(self):
         """Stop the consumer"""
         logger.info("Stopping transaction consumer")
         self.running = False
     
-    async def get_transaction(self) -> Optional[Dict[str, Any]]:
-        """Get next transaction from queue"""
-        try:
-            # Use timeout to avoid blocking indefinitely
-            transaction = await asyncio.wait_for(
-                self.transaction_queue.get(), 
-                timeout=1.0
-            )
-            self.processed_count += 1
-            return transaction
-        except asyncio.TimeoutError:
-            return None
+    async def get_transaction(self) -> TransactionRecord:
+        """Wait for the next transaction in the queue"""
+        queue = self.transaction_queue
+        while not queue:
+            # Loops only if another consumer took the item first
+            self._available.clear()
+            await self._available.wait()
+        self.processed_count += 1
+        return queue.popleft()
+    
+    async def get_transaction_batch(self, max_items: int = 128, max_wait_ms: float = 2) -> List[TransactionRecord]:
+        """Drain up to max_items queued transactions at once
+
+        Waits at most max_wait_ms for the queue to become non-empty, then takes
+        whatever is queued (up to max_items) without yielding to the loop.
+        """
+        queue = self.transaction_queue
+        if not queue:
+            self._available.clear()
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout=max_wait_ms / 1000)
+            except asyncio.TimeoutError:
+                return []
+        batch = [queue.popleft() for _ in range(min(max_items, len(queue)))]
+        self.processed_count += len(batch)
+        return batch
     
-    async def add_transaction(self, transaction: Dict[str, Any]):
+    async def add_transaction(self, transaction: TransactionRecord):
         """Add transaction to processing queue"""
-        try:
-            # Add timestamp if not present
-            if "timestamp" not in transaction:
-                transaction["timestamp"] = datetime.utcnow().isoformat()
-            
-            await self.transaction_queue.put(transaction)
-            logger.debug("Transaction queued", transaction_id=transaction.get("transaction_id"))
-            
-        except asyncio.QueueFull:
+        if len(self.transaction_queue) >= self.queue_size:
             logger.warning("Transaction queue is full, dropping transaction")
+            return
+        
+        # Add timestamp if not present
+        if transaction.timestamp is None:
+            transaction.timestamp_ns = time.time_ns()
+        
+        self.transaction_queue.append(transaction)
+        self._available.set()
+        logger.debug("Transaction queued", transaction_id=transaction.transaction_id)
+    
+    async def add_transactions(self, transactions: List[TransactionRecord]):
+        """Add several transactions to the processing queue, waking consumers once"""
+        room = self.queue_size - len(self.transaction_queue)
+        if len(transactions) > room:
+            logger.warning("Transaction queue is full, dropping transactions", dropped=len(transactions) - max(room, 0))
+            transactions = transactions[:max(room, 0)]
+        if not transactions:
+            return
+        
+        now_ns = time.time_ns()
+        for transaction in transactions:
+            if transaction.timestamp is None:
+                transaction.timestamp_ns = now_ns
+        
+        self.transaction_queue.extend(transactions)
+        self._available.set()
+    
+    async def add_raw_transaction(self, raw: bytes):
+        """Decode a JSON transaction message and add it to the processing queue"""
+        try:
+            transaction = transaction_decoder.decode(raw)
+        except msgspec.DecodeError as e:
+            logger.warning("Dropping malformed transaction", error=str(e))
+            return
+        await self.add_transaction(transaction)
+    
+    async def _consume_kafka(self):
+        """Feed the local queue from the Kafka topic as part of the consumer group"""
+        logger.info("Consuming transactions from Kafka", topic=KAFKA_TOPIC, group_id=KAFKA_GROUP_ID)
+        consumer = AIOKafkaConsumer(
+            KAFKA_TOPIC,
+            bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+            group_id=KAFKA_GROUP_ID,
+            max_poll_records=KAFKA_MAX_POLL_RECORDS
+        )
+        await consumer.start()
+        try:
+            while self.running:
+                # Only fetch what the queue has room for; the rest stays on the
+                # broker as consumer lag instead of being dropped here
+                room = self.queue_size - len(self.transaction_queue)
+                if room <= 0:
+                    await asyncio.sleep(0.01)
+                    continue
+                batches = await consumer.getmany(timeout_ms=100, max_records=min(room, KAFKA_MAX_POLL_RECORDS))
+                transactions = []
+                for messages in batches.values():
+                    for message in messages:
+                        try:
+                            transactions.append(transaction_decoder.decode(message.value))
+                        except msgspec.DecodeError as e:
+                            logger.warning("Dropping malformed transaction", error=str(e))
+                await self.add_transactions(transactions)
+        finally:
+            await consumer.stop()
     
     async def _simulate_transaction_stream(self):
         """Simulate incoming transaction stream for testing"""
@@ -74,7 +226,7 @@ class TransactionConsumer:
     
     def get_queue_size(self) -> int:
         """Get current queue size"""
-        return self.transaction_queue.qsize()
+        return len(self.transaction_queue)
     
     def get_processed_count(self) -> int:
         """Get total processed transaction count"""
@@ -4,17 +4,43 @@ Asyncio-based stream processor for real-time transaction monitoring
 """
 
 import asyncio
-import json
+import logging
+import msgspec
+import orjson
 import structlog
-from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import aiofiles
 import httpx
 from pathlib import Path
 
-from .consumer import TransactionConsumer
+try:
+    import h2  # noqa: F401 - httpx needs it for http2=True
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+from .batching import MLPredictionBatcher
+from .consumer import TransactionRecord, transaction_consumer, utc_isoformat
 from .producer import TransactionProducer
 
+class MLRequest(msgspec.Struct, gc=False):
+    """One /predict_batch item, built positionally and encoded without an intermediate dict"""
+    transaction_id: str
+    customer_id: str
+    account_id: Optional[str]
+    amount: float
+    currency: str
+    transaction_type: str
+    description: Optional[str]
+    location: Optional[Dict[str, Any]]
+    timestamp: Optional[str]
+
+ml_request_encoder = msgspec.json.Encoder()
+
+def _render_json(event_dict, **kwargs) -> str:
+    """orjson serializer for JSONRenderer; the stdlib logger wants str, not bytes"""
+    return orjson.dumps(event_dict, default=kwargs.get("default")).decode()
+
 # Configure structured logging
 structlog.configure(
     processors=[
@@ -26,26 +52,69 @@ structlog.configure(
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
         structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
+        structlog.processors.JSONRenderer(serializer=_render_json)
     ],
     context_class=dict,
+    # Debug calls return before any processor runs
+    wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
     logger_factory=structlog.stdlib.LoggerFactory(),
     cache_logger_on_first_use=True,
 )
 
 logger = structlog.get_logger()
 
+# Transactions processed concurrently, one worker each; the work is mostly
+# waiting on the ML service
+MAX_IN_FLIGHT = 256
+
+# Alert type and title for a triggered rule, highest priority first
+_RULE_ALERT_MAP = {
+    "structuring": ("structuring", "Potential Structuring Pattern Detected"),
+    "velocity": ("velocity", "High-Velocity Transaction Pattern"),
+    "geographic": ("geographic", "Unusual Geographic Activity"),
+}
+_DEFAULT_ALERT = ("anomaly", "Anomalous Transaction Detected")
+
+def alert_description(risk_score: float, triggered_rules: List[str], ml_confidence: Optional[float]) -> str:
+    """Human-readable alert description, built when an alert is stored or shown"""
+    description = f"Transaction flagged with risk score {risk_score}. "
+    if triggered_rules:
+        description += f"Rules triggered: {', '.join(triggered_rules)}. "
+    if ml_confidence is not None:
+        description += f"ML confidence: {ml_confidence:.2f}"
+    return description
+
+def combine_risk_scores(ml_score: float, max_rule_score: float, triggered: bool) -> float:
+    """Final 0-10 risk score from the ML score and the highest rule score"""
+    if triggered:
+        # If rules are triggered, boost the score
+        final_score = 0.6 * ml_score + 0.4 * max_rule_score * 10 + 1.0
+        if final_score > 10.0:
+            final_score = 10.0
+    else:
+        # No rules triggered, use mostly ML score
+        final_score = 0.8 * ml_score + 0.2 * max_rule_score * 10
+    return round(final_score, 2)
+
 class StreamProcessor:
     """Main stream processing coordinator"""
     
     def __init__(self):
-        self.consumer = TransactionConsumer()
+        # The producer enqueues into the shared consumer, so read from the same one
+        self.consumer = transaction_consumer
         self.producer = TransactionProducer()
         self.ml_service_url = "http://localhost:8001"
         self.api_service_url = "http://localhost:8000"
+        # Shared for every ML call so connections are kept alive between transactions
+        self._http_client: Optional[httpx.AsyncClient] = None
+        # Concurrent predictions share one /predict_batch round-trip
+        self._ml_batcher = MLPredictionBatcher(self._post_prediction_batch, max_batch_size=64, max_queue_time=0.02)
         self.rules_engine = None
         self.running = False
         self.processed_count = 0
+        # Long-lived workers pulling from the queue; a busy pool leaves work
+        # queued instead of piling up tasks
+        self._workers: List[asyncio.Task] = []
         
     async def start(self):
         """Start the stream processor"""
@@ -56,13 +125,30 @@ class StreamProcessor:
         self.rules_engine = RulesEngine()
         await self.rules_engine.load_rules()
         
+        # HTTP/2 multiplexes concurrent predictions over one connection. httpx
+        # negotiates it through TLS ALPN, so plain-http URLs stay on HTTP/1.1
+        self._http_client = httpx.AsyncClient(
+            base_url=self.ml_service_url,
+            timeout=30.0,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=50 if HTTP2_AVAILABLE else 200,
+                max_keepalive_connections=50 if HTTP2_AVAILABLE else 100,
+                keepalive_expiry=30
+            )
+        )
+        
+        self._ml_batcher.start()
+        
         self.running = True
         
         # Start consumer and producer tasks
+        logger.info("Starting transaction workers", workers=MAX_IN_FLIGHT)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(MAX_IN_FLIGHT)]
         tasks = [
             asyncio.create_task(self.consumer.start()),
             asyncio.create_task(self.producer.start()),
-            asyncio.create_task(self._process_transactions())
+            *self._workers
         ]
         
         try:
@@ -80,41 +166,38 @@ class StreamProcessor:
         await self.consumer.stop()
         await self.producer.stop()
         
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        
+        await self._ml_batcher.stop()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        
         logger.info("Stream processor stopped", processed_count=self.processed_count)
     
-    async def _process_transactions(self):
-        """Main transaction processing loop"""
-        logger.info("Starting transaction processing loop")
+    async def _worker(self):
+        """Process transactions from the queue until the processor stops"""
         
         while self.running:
-            try:
-                # Get next transaction from queue
-                transaction = await self.consumer.get_transaction()
-                
-                if transaction is None:
-                    await asyncio.sleep(0.1)
-                    continue
-                
-                # Process the transaction
-                await self._process_single_transaction(transaction)
-                self.processed_count += 1
-                
-            except Exception as e:
-                logger.error("Error processing transaction", error=str(e))
-                await asyncio.sleep(1)
+            transaction = await self.consumer.get_transaction()
+            # Pipeline errors are logged per transaction inside
+            await self._process_single_transaction(transaction)
     
-    async def _process_single_transaction(self, transaction: Dict[str, Any]):
+    async def _process_single_transaction(self, transaction: TransactionRecord):
         """Process a single transaction through the AML pipeline"""
         
-        transaction_id = transaction.get("transaction_id", "unknown")
-        logger.info("Processing transaction", transaction_id=transaction_id)
+        transaction_id = transaction.transaction_id
+        logger.debug("Processing transaction", transaction_id=transaction_id)
         
         try:
-            # Step 1: Get ML risk score
-            risk_prediction = await self._get_ml_prediction(transaction)
-            
-            # Step 2: Apply rules engine
-            rule_results = await self._apply_rules(transaction)
+            # Steps 1-2: ML risk score and rules engine, which don't depend on each other
+            risk_prediction, rule_results = await asyncio.gather(
+                self._get_ml_prediction(transaction),
+                self._apply_rules(transaction)
+            )
             
             # Step 3: Calculate final risk score
             final_risk_score = self._calculate_final_risk_score(risk_prediction, rule_results)
@@ -123,58 +206,71 @@ class StreamProcessor:
             await self._update_transaction(transaction_id, risk_prediction, rule_results, final_risk_score)
             
             # Step 5: Create alert if necessary
-            if final_risk_score >= 6.0:  # High risk threshold
+            alerted = final_risk_score >= 6.0  # High risk threshold
+            if alerted:
                 await self._create_alert(transaction, risk_prediction, rule_results, final_risk_score)
             
+            # The one INFO line per transaction; the step payloads are logged at DEBUG
             logger.info(
-                "Transaction processed successfully",
+                "Transaction processed",
                 transaction_id=transaction_id,
                 risk_score=final_risk_score,
-                rules_triggered=len(rule_results.get("triggered_rules", []))
+                rules_triggered=len(rule_results.get("triggered_rules", [])),
+                alerted=alerted
             )
             
         except Exception as e:
             logger.error("Failed to process transaction", transaction_id=transaction_id, error=str(e))
+        
+        self.processed_count += 1
     
-    async def _get_ml_prediction(self, transaction: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def _get_ml_prediction(self, transaction: TransactionRecord) -> Optional[Dict[str, Any]]:
         """Get ML risk prediction for transaction"""
         
+        # The ML service rejects non-positive amounts, and one invalid item
+        # would fail the whole /predict_batch request it is batched into
+        if not transaction.amount > 0:
+            logger.warning("Skipping ML prediction for non-positive amount", transaction_id=transaction.transaction_id)
+            return None
+        
         try:
             # Prepare transaction data for ML service
-            ml_request = {
-                "transaction_id": transaction.get("transaction_id"),
-                "customer_id": transaction.get("customer_id"),
-                "account_id": transaction.get("from_account_id"),
-                "amount": transaction.get("amount"),
-                "currency": transaction.get("currency", "USD"),
-                "transaction_type": transaction.get("transaction_type"),
-                "description": transaction.get("description"),
-                "location": transaction.get("location"),
-                "timestamp": transaction.get("timestamp")
-            }
+            ml_request = MLRequest(
+                transaction.transaction_id,
+                transaction.customer_id,
+                transaction.from_account_id,
+                transaction.amount,
+                transaction.currency,
+                transaction.transaction_type,
+                transaction.description,
+                transaction.location,
+                transaction.iso_timestamp
+            )
+            
+            return await self._ml_batcher.process(ml_request)
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.ml_service_url}/predict",
-                    json=ml_request,
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.warning(
-                        "ML service request failed",
-                        status_code=response.status_code,
-                        response=response.text
-                    )
-                    return None
-                    
         except Exception as e:
             logger.error("ML prediction failed", error=str(e))
             return None
     
-    async def _apply_rules(self, transaction: Dict[str, Any]) -> Dict[str, Any]:
+    async def _post_prediction_batch(self, ml_requests: List[MLRequest]) -> List[Optional[Dict[str, Any]]]:
+        """Score a batch through the ML service's /predict_batch endpoint"""
+        
+        response = await self._http_client.post(
+            "/predict_batch",
+            content=ml_request_encoder.encode(ml_requests),
+            headers={"content-type": "application/json"}
+        )
+        if response.status_code == 200:
+            return orjson.loads(response.content)
+        logger.warning(
+            "ML service request failed",
+            status_code=response.status_code,
+            response=response.text
+        )
+        return [None] * len(ml_requests)
+    
+    async def _apply_rules(self, transaction: TransactionRecord) -> Dict[str, Any]:
         """Apply rules engine to transaction"""
         
         if self.rules_engine is None:
@@ -190,23 +286,14 @@ class StreamProcessor:
         """Calculate final risk score combining ML and rules"""
         
         # Get ML risk score (0-10 scale)
-        ml_score = 0.0
-        if ml_prediction:
-            ml_score = ml_prediction.get("risk_score", 0.0)
+        ml_score = ml_prediction.get("risk_score", 0.0) if ml_prediction else 0.0
         
         # Get highest rule score
-        rule_scores = rule_results.get("rule_scores", {})
+        rule_scores = rule_results.get("rule_scores")
         max_rule_score = max(rule_scores.values()) if rule_scores else 0.0
         
         # Combine scores (weighted average with boost for rule triggers)
-        if rule_results.get("triggered_rules"):
-            # If rules are triggered, boost the score
-            final_score = min(10.0, (0.6 * ml_score) + (0.4 * max_rule_score * 10) + 1.0)
-        else:
-            # No rules triggered, use mostly ML score
-            final_score = (0.8 * ml_score) + (0.2 * max_rule_score * 10)
-        
-        return round(final_score, 2)
+        return combine_risk_scores(ml_score, max_rule_score, bool(rule_results.get("triggered_rules")))
     
     async def _update_transaction(self, transaction_id: str, ml_prediction: Optional[Dict], 
                                 rule_results: Dict, final_risk_score: float):
@@ -218,17 +305,17 @@ class StreamProcessor:
                 "ml_prediction": ml_prediction,
                 "rules_hit": rule_results.get("triggered_rules", []),
                 "status": "flagged" if final_risk_score >= 6.0 else "clear",
-                "processed_at": datetime.utcnow().isoformat()
+                "processed_at": utc_isoformat()
             }
             
             # In a real implementation, this would update the database directly
             # For now, we'll log the update
-            logger.info("Transaction updated", transaction_id=transaction_id, update_data=update_data)
+            logger.debug("Transaction updated", transaction_id=transaction_id, update_data=update_data)
             
         except Exception as e:
             logger.error("Failed to update transaction", transaction_id=transaction_id, error=str(e))
     
-    async def _create_alert(self, transaction: Dict, ml_prediction: Optional[Dict], 
+    async def _create_alert(self, transaction: TransactionRecord, ml_prediction: Optional[Dict], 
                           rule_results: Dict, risk_score: float):
         """Create alert for high-risk transaction"""
         
@@ -243,38 +330,26 @@ class StreamProcessor:
             
             # Determine alert type based on triggered rules
             triggered_rules = rule_results.get("triggered_rules", [])
-            if "structuring" in triggered_rules:
-                alert_type = "structuring"
-                title = "Potential Structuring Pattern Detected"
-            elif "velocity" in triggered_rules:
-                alert_type = "velocity"
-                title = "High-Velocity Transaction Pattern"
-            elif "geographic" in triggered_rules:
-                alert_type = "geographic"
-                title = "Unusual Geographic Activity"
-            else:
-                alert_type = "anomaly"
-                title = "Anomalous Transaction Detected"
-            
-            # Generate description
-            description = f"Transaction flagged with risk score {risk_score}. "
-            if triggered_rules:
-                description += f"Rules triggered: {', '.join(triggered_rules)}. "
-            if ml_prediction:
-                description += f"ML confidence: {ml_prediction.get('confidence', 0):.2f}"
+            triggered = set(triggered_rules)
+            alert_type, title = next(
+                (alert for rule, alert in _RULE_ALERT_MAP.items() if rule in triggered),
+                _DEFAULT_ALERT
+            )
             
+            # Raw inputs only; alert_description() renders the text when it is needed
             alert_data = {
-                "transaction_id": transaction.get("transaction_id"),
-                "customer_id": transaction.get("customer_id"),
+                "transaction_id": transaction.transaction_id,
+                "customer_id": transaction.customer_id,
                 "alert_type": alert_type,
                 "severity": severity,
                 "title": title,
-                "description": description,
-                "risk_score": risk_score
+                "risk_score": risk_score,
+                "triggered_rules": triggered_rules,
+                "ml_confidence": ml_prediction.get("confidence", 0) if ml_prediction else None
             }
             
             # In a real implementation, this would create an alert in the database
-            logger.info("Alert created", alert_data=alert_data)
+            logger.debug("Alert created", alert_data=alert_data)
             
         except Exception as e:
             logger.error("Failed to create alert", error=str(e))
@@ -5,18 +5,41 @@ Generates synthetic transaction streams for testing and development
 
 import asyncio
 import json
+import os
 import structlog
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
-from uuid import uuid4
 import random
+import numpy as np
 from faker import Faker
 
-from .consumer import transaction_consumer
+from .consumer import (
+    TransactionRecord, transaction_consumer, utc_isoformat,
+    kafka_enabled, AIOKafkaProducer, KAFKA_BOOTSTRAP_SERVERS, KAFKA_TOPIC, transaction_encoder
+)
 
 logger = structlog.get_logger()
 fake = Faker()
 
+# Faker values drawn once at startup; transactions pick from these pools
+FAKE_POOL_SIZE = 10_000
+
+# UUIDs formatted per os.urandom call
+UUID_POOL_SIZE = 1024
+
+def _random_uuids(count: int) -> List[str]:
+    """Format count random version-4 UUID strings from a single os.urandom call"""
+    raw = os.urandom(16 * count).hex()
+    uuids = []
+    for i in range(0, len(raw), 32):
+        h = raw[i:i + 32]
+        # Version nibble 4, variant bits 10
+        uuids.append(f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{'89ab'[int(h[16], 16) & 3]}{h[17:20]}-{h[20:]}")
+    return uuids
+
+# Card payments most common
+NORMAL_TYPE_WEIGHTS = [0.1, 0.3, 0.4, 0.1, 0.05, 0.02, 0.02, 0.01]
+
 class TransactionProducer:
     """Synthetic transaction producer for testing"""
     
@@ -25,6 +48,9 @@ class TransactionProducer:
         self.generated_count = 0
         self.customers = []
         self.accounts = []
+        self._customer_by_id: Dict[str, Dict[str, Any]] = {}
+        # Owning customer of each account, indexed like self.accounts
+        self._account_customers: List[Dict[str, Any]] = []
         self.transaction_types = [
             "Wire Transfer", "ACH Transfer", "Card Payment", "ATM Withdrawal",
             "Online Transfer", "Check Deposit", "Cash Deposit", "International Transfer"
@@ -33,6 +59,18 @@ class TransactionProducer:
             "US", "CA", "GB", "DE", "FR", "AU", "JP", "CH", "NL", "SE",
             "CN", "RU", "IR", "KP", "AF", "SY", "VE", "MY", "PK", "BD"
         ]
+        # Normalized CDF so a batch of types is one searchsorted over uniform draws
+        self._type_cdf = np.cumsum(NORMAL_TYPE_WEIGHTS)
+        self._type_cdf /= self._type_cdf[-1]
+        # Numeric draws for a whole stream batch come from here
+        self._rng = np.random.default_rng()
+        self._cities: List[str] = []
+        self._companies: List[str] = []
+        self._coords: List[tuple] = []
+        # Suspicion probability per account, indexed like self.accounts
+        self._account_suspicion = np.zeros(0)
+        self._uuid_pool: List[str] = []
+        self._kafka_producer = None
         
     async def start(self):
         """Start the transaction producer"""
@@ -42,8 +80,17 @@ class TransactionProducer:
         # Initialize customer and account data
         await self._initialize_data()
         
+        if kafka_enabled():
+            self._kafka_producer = AIOKafkaProducer(bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS)
+            await self._kafka_producer.start()
+        
         # Start generating transactions
-        await self._generate_transaction_stream()
+        try:
+            await self._generate_transaction_stream()
+        finally:
+            if self._kafka_producer is not None:
+                await self._kafka_producer.stop()
+                self._kafka_producer = None
     
     async def stop(self):
         """Stop the transaction producer"""
@@ -57,7 +104,7 @@ class TransactionProducer:
         # Generate customers
         for _ in range(100):
             customer = {
-                "id": str(uuid4()),
+                "id": self._next_uuid(),
                 "first_name": fake.first_name(),
                 "last_name": fake.last_name(),
                 "email": fake.email(),
@@ -72,7 +119,7 @@ class TransactionProducer:
             
             for _ in range(num_accounts):
                 account = {
-                    "id": str(uuid4()),
+                    "id": self._next_uuid(),
                     "customer_id": customer["id"],
                     "account_number": fake.iban(),
                     "account_type": random.choice(["checking", "savings", "business"]),
@@ -81,8 +128,22 @@ class TransactionProducer:
                 }
                 self.accounts.append(account)
         
+        self._customer_by_id = {c["id"]: c for c in self.customers}
+        self._account_customers = [self._customer_by_id[a["customer_id"]] for a in self.accounts]
+        self._account_suspicion = np.array([self._suspicious_probability(c) for c in self._account_customers])
+        
+        self._cities = [fake.city() for _ in range(FAKE_POOL_SIZE)]
+        self._companies = [fake.company() for _ in range(FAKE_POOL_SIZE)]
+        self._coords = [(float(fake.latitude()), float(fake.longitude())) for _ in range(FAKE_POOL_SIZE)]
+        
         logger.info(f"Initialized {len(self.customers)} customers and {len(self.accounts)} accounts")
     
+    def _next_uuid(self) -> str:
+        """Next random UUID string, refilling the pool when it runs out"""
+        if not self._uuid_pool:
+            self._uuid_pool = _random_uuids(UUID_POOL_SIZE)
+        return self._uuid_pool.pop()
+    
     async def _generate_transaction_stream(self):
         """Generate continuous stream of transactions"""
         logger.info("Starting transaction stream generation")
@@ -92,9 +153,11 @@ class TransactionProducer:
                 # Generate batch of transactions
                 batch_size = random.randint(1, 5)
                 
-                for _ in range(batch_size):
-                    transaction = await self._generate_transaction()
-                    await transaction_consumer.add_transaction(transaction)
+                batch = await self._generate_batch(batch_size)
+                if self._kafka_producer is not None:
+                    await self._publish(batch)
+                else:
+                    await transaction_consumer.add_transactions(batch)
                 
                 # Wait before next batch (simulate realistic timing)
                 await asyncio.sleep(random.uniform(2, 10))
@@ -103,26 +166,53 @@ class TransactionProducer:
                 logger.error("Error generating transactions", error=str(e))
                 await asyncio.sleep(5)
     
-    async def _generate_transaction(self) -> Dict[str, Any]:
-        """Generate a single transaction"""
-        
-        # Select random account
-        account = random.choice(self.accounts)
-        customer = next(c for c in self.customers if c["id"] == account["customer_id"])
+    async def _publish(self, batch: List[TransactionRecord]):
+        """Send a batch to the Kafka topic and wait for the broker to acknowledge it"""
+        # Keyed by customer so each customer's transactions stay ordered in one partition
+        sends = [
+            await self._kafka_producer.send(
+                KAFKA_TOPIC, transaction_encoder.encode(t), key=t.customer_id.encode()
+            )
+            for t in batch
+        ]
+        await asyncio.gather(*sends)
+    
+    async def _generate_batch(self, size: int) -> List[TransactionRecord]:
+        """Generate several transactions, drawing their random numbers as arrays
         
-        # Determine if this should be a suspicious transaction
-        is_suspicious = self._should_generate_suspicious_transaction(customer)
+        Account picks, suspicion draws, normal amounts, types and pool indices
+        come from one numpy call each; only suspicious transactions still draw
+        their pattern-specific fields one at a time.
+        """
+        rng = self._rng
+        accounts = self.accounts
+        account_customers = self._account_customers
+        account_idx = rng.integers(len(accounts), size=size)
+        is_suspicious = (rng.random(size) < self._account_suspicion[account_idx]).tolist()
+        account_idx = account_idx.tolist()
+        # Normal transaction amounts (log-normal distribution, ~$150 average)
+        amounts = np.maximum(10, rng.lognormal(5, 1.5, size=size)).round(2).tolist()
+        type_idx = np.searchsorted(self._type_cdf, rng.random(size), side="right").tolist()
+        city_idx, company_idx, coord_idx = rng.integers(FAKE_POOL_SIZE, size=(3, size)).tolist()
         
-        if is_suspicious:
-            transaction = await self._generate_suspicious_transaction(account, customer)
-        else:
-            transaction = await self._generate_normal_transaction(account, customer)
+        batch = []
+        for i in range(size):
+            account = accounts[account_idx[i]]
+            customer = account_customers[account_idx[i]]
+            if is_suspicious[i]:
+                transaction = await self._generate_suspicious_transaction(account, customer)
+            else:
+                transaction = self._build_normal_transaction(
+                    account, customer, amounts[i], self.transaction_types[type_idx[i]],
+                    self._cities[city_idx[i]], self._companies[company_idx[i]], self._coords[coord_idx[i]]
+                )
+            batch.append(transaction)
         
-        self.generated_count += 1
-        return transaction
+        self.generated_count += size
+        return batch
     
-    def _should_generate_suspicious_transaction(self, customer: Dict[str, Any]) -> bool:
-        """Determine if we should generate a suspicious transaction"""
+    def _suspicious_probability(self, customer: Dict[str, Any]) -> float:
+        """Chance that a customer's transaction is generated as suspicious"""
         
         # Base probability
         base_prob = 0.05  # 5% suspicious transactions
@@ -133,45 +223,43 @@ class TransactionProducer:
         elif customer["risk_level"] == "medium":
             base_prob = 0.08
         
-        return random.random() < base_prob
+        return base_prob
     
-    async def _generate_normal_transaction(self, account: Dict[str, Any], customer: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate a normal transaction"""
-        
-        # Normal transaction amounts (log-normal distribution)
-        amount = max(10, random.lognormvariate(5, 1.5))  # ~$150 average
-        
-        # Normal transaction types (weighted)
-        transaction_type = random.choices(
-            self.transaction_types,
-            weights=[0.1, 0.3, 0.4, 0.1, 0.05, 0.02, 0.02, 0.01]  # Card payments most common
-        )[0]
+    def _make_location(self, country: str, city: Optional[str] = None,
+                       coords: Optional[tuple] = None) -> Dict[str, Any]:
+        """Location dict for a transaction, drawing city and coordinates from the pools if not given"""
+        if city is None:
+            city = random.choice(self._cities)
+        if coords is None:
+            coords = random.choice(self._coords)
+        lat, lng = coords
+        return {"country": country, "city": city, "coordinates": {"lat": lat, "lng": lng}}
+    
+    def _build_normal_transaction(self, account: Dict[str, Any], customer: Dict[str, Any], amount: float,
+                                  transaction_type: str, city: str, company: str, coords: tuple) -> TransactionRecord:
+        """Assemble a normal transaction from already drawn values"""
         
         # Normal timing (business hours more likely)
         timestamp = self._generate_normal_timestamp()
         
         # Normal location (home country)
-        location = {
-            "country": "US",
-            "city": fake.city(),
-            "coordinates": {"lat": float(fake.latitude()), "lng": float(fake.longitude())}
-        }
+        location = self._make_location("US", city, coords)
         
-        return {
-            "transaction_id": str(uuid4()),
-            "customer_id": customer["id"],
-            "from_account_id": account["id"],
-            "to_account_id": None,
-            "amount": round(amount, 2),
-            "currency": "USD",
-            "transaction_type": transaction_type,
-            "description": f"{transaction_type} - {fake.company()}",
-            "location": location,
-            "timestamp": timestamp.isoformat(),
-            "is_suspicious": False
-        }
+        return TransactionRecord(
+            transaction_id=self._next_uuid(),
+            customer_id=customer["id"],
+            from_account_id=account["id"],
+            to_account_id=None,
+            amount=amount,
+            currency="USD",
+            transaction_type=transaction_type,
+            description=f"{transaction_type} - {company}",
+            location=location,
+            timestamp=timestamp.isoformat(),
+            is_suspicious=False
+        )
     
-    async def _generate_suspicious_transaction(self, account: Dict[str, Any], customer: Dict[str, Any]) -> Dict[str, Any]:
+    async def _generate_suspicious_transaction(self, account: Dict[str, Any], customer: Dict[str, Any]) -> TransactionRecord:
         """Generate a suspicious transaction with AML red flags"""
         
         # Choose type of suspicious pattern
@@ -187,7 +275,7 @@ class TransactionProducer:
         pattern = random.choice(suspicious_patterns)
         
         transaction = {
-            "transaction_id": str(uuid4()),
+            "transaction_id": self._next_uuid(),
             "customer_id": customer["id"],
             "from_account_id": account["id"],
             "to_account_id": None,
@@ -223,11 +311,7 @@ class TransactionProducer:
             transaction["amount"] = random.uniform(5000, 25000)
             transaction["transaction_type"] = "International Transfer"
             transaction["description"] = "International wire transfer"
-            transaction["location"] = {
-                "country": country,
-                "city": fake.city(),
-                "coordinates": {"lat": float(fake.latitude()), "lng": float(fake.longitude())}
-            }
+            transaction["location"] = self._make_location(country)
             
         elif pattern == "late_night":
             # Late night transactions
@@ -252,15 +336,11 @@ class TransactionProducer:
         if "description" not in transaction:
             transaction["description"] = "Suspicious transaction"
         if "location" not in transaction:
-            transaction["location"] = {
-                "country": "US",
-                "city": fake.city(),
-                "coordinates": {"lat": float(fake.latitude()), "lng": float(fake.longitude())}
-            }
+            transaction["location"] = self._make_location("US")
         if "timestamp" not in transaction:
-            transaction["timestamp"] = datetime.utcnow().isoformat()
+            transaction["timestamp"] = utc_isoformat()
         
-        return transaction
+        return TransactionRecord(**transaction)
     
     def _generate_normal_timestamp(self) -> datetime:
         """Generate timestamp for normal transaction (business hours more likely)"""
@@ -269,16 +349,15 @@ class TransactionProducer:
         
         # 70% chance during business hours (9 AM - 5 PM weekdays)
         if random.random() < 0.7:
-            # Business hours
-            business_day = now.replace(
+            # Business hours, moved back to Friday on weekends
+            weekday = now.weekday()
+            if weekday >= 5:
+                now -= timedelta(days=weekday - 4)
+            return now.replace(
                 hour=random.randint(9, 17),
                 minute=random.randint(0, 59),
                 second=random.randint(0, 59)
             )
-            # Ensure it's a weekday
-            while business_day.weekday() >= 5:
-                business_day -= timedelta(days=1)
-            return business_day
         else:
             # Random time
             return now.replace(